@@ -0,0 +1,124 @@
+from math import gcd
+from ngrams import default_model
+import numpy as np
+import string
+
+alphabet = string.ascii_lowercase
+
+# the 12 invertible multipliers times 26 offsets
+AFFINE_KEYS = [(a, b) for a in range(26) if gcd(a, 26) == 1 for b in range(26)]
+
+
+def mod_inverse(a, m):
+    ''' Return the modular inverse of `a` (int) modulo `m` (int), None if there is none
+    '''
+    if gcd(a, m) != 1:
+        return None
+    return pow(a, -1, m)
+
+
+def affine_table(a, b):
+    ''' Translation table for `str.translate` sending letter x to a*x + b '''
+    return str.maketrans(alphabet, ''.join(alphabet[(a * i + b) % 26] for i in range(26)))
+
+
+def caesar_table(shift):
+    return affine_table(1, shift)
+
+
+def substitution_table(mapping):
+    ''' Translation table for a `mapping` (dict) from plaintext letters to ciphertext letters '''
+    return str.maketrans(mapping)
+
+
+def caesar_encrypt(plaintext, shift=0):
+    return plaintext.translate(caesar_table(shift))
+
+
+def caesar_decrypt(ciphertext, shift=0):
+    return ciphertext.translate(caesar_table(-shift))
+
+
+def affine_encrypt(plaintext, a, b):
+    if mod_inverse(a, 26) is None:
+        raise ValueError("a is not invertible modulo 26")
+    return plaintext.translate(affine_table(a, b))
+
+
+def affine_decrypt(ciphertext, a, b):
+    inverse_a = mod_inverse(a, 26)
+    if inverse_a is None:
+        raise ValueError("a is not invertible modulo 26")
+    return ciphertext.translate(affine_table(inverse_a, -inverse_a * b))
+
+
+def substitution_encrypt(plaintext, mapping):
+    return plaintext.translate(substitution_table(mapping))
+
+
+def substitution_decrypt(ciphertext, mapping):
+    return ciphertext.translate(substitution_table({v: k for k, v in mapping.items()}))
+
+
+def lookup_table(permutation):
+    ''' NumPy uint8 lookup for encoded text: byte 'a' + i maps to 'a' + permutation[i],
+        everything else to itself. Apply with table[np.frombuffer(data, np.uint8)] '''
+    table = np.arange(256, dtype=np.uint8)
+    table[97:123] = 97 + np.asarray(permutation, dtype=np.uint8)
+    return table
+
+
+def letter_counts(text):
+    ''' Counts of a..z (either case) in `text` (str or bytes) from a single bincount '''
+    if isinstance(text, str):
+        text = text.encode('utf-8')
+    counts = np.bincount(np.frombuffer(text, dtype=np.uint8), minlength=256)
+    return counts[97:123] + counts[65:91]
+
+
+def english_distribution(model=None):
+    ''' The English letter distribution as an array of 26 probabilities, from an
+        `NgramModel` (the cached corpus model by default) '''
+    if model is None:
+        model = default_model()
+    return model.distribution()
+
+
+def _as_probabilities(distribution):
+    if distribution is None:
+        distribution = english_distribution()
+    elif isinstance(distribution, dict):
+        distribution = [distribution.get(char, 0.0) for char in alphabet]
+    distribution = np.asarray(distribution, dtype=np.float64)
+    # letters missing from the reference would make chi-squared infinite
+    distribution = np.maximum(distribution, 1e-6)
+    return distribution / distribution.sum()
+
+
+def chi_squared(counts, distribution=None):
+    ''' Chi-squared of letter `counts` against `distribution`, along the last axis '''
+    counts = np.asarray(counts, dtype=np.float64)
+    expected = counts.sum(axis=-1, keepdims=True) * _as_probabilities(distribution)
+    return (((counts - expected) ** 2) / np.maximum(expected, 1e-12)).sum(axis=-1)
+
+
+def rank_keys(ciphertext, keys, distribution=None):
+    ''' Rank affine `keys` (list of (a, b)) for decrypting `ciphertext`, best first.
+        Returns a list of (key, chi-squared) pairs '''
+    counts = letter_counts(ciphertext)
+    keys = np.asarray(keys).reshape(-1, 2)
+    # plaintext letter p of key (a, b) was ciphertext letter a*p + b
+    encrypt = (keys[:, :1] * np.arange(26) + keys[:, 1:]) % 26
+    scores = chi_squared(counts[encrypt], distribution)
+    order = np.argsort(scores, kind='stable')
+    return [(tuple(int(k) for k in keys[i]), float(scores[i])) for i in order]
+
+
+def rank_caesar(ciphertext, distribution=None):
+    ''' All 26 shifts ranked by chi-squared, as a list of (shift, chi-squared) '''
+    return [(b, score) for (_, b), score in rank_keys(ciphertext, [(1, b) for b in range(26)], distribution)]
+
+
+def rank_affine(ciphertext, distribution=None):
+    ''' All 312 affine keys ranked by chi-squared, as a list of ((a, b), chi-squared) '''
+    return rank_keys(ciphertext, AFFINE_KEYS, distribution)
@@ -0,0 +1,137 @@
+import numpy as np
+import os
+import string
+
+alphabet = string.ascii_lowercase
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'wikipedia_cybersecurity.txt')
+
+# binary layout: 64-byte header (magic, format version, largest n), then the
+# little-endian int64 counts of all 26^1, 26^2, ..., 26^n_max n-grams back to back
+MAGIC = b'NGRAMS\0\0'
+VERSION = 1
+HEADER_SIZE = 64
+
+
+def encode_letters(text):
+    ''' The letters of `text` (str or bytes) as an array of codes 0..25, everything else dropped '''
+    if isinstance(text, str):
+        text = text.encode('utf-8')
+    data = np.frombuffer(text, dtype=np.uint8) | 0x20  # fold to lower case
+    return (data[(data >= 97) & (data <= 122)] - 97).astype(np.int64)
+
+
+def ngram_codes(codes, n):
+    ''' Flat index (base 26, first letter most significant) of every n-gram in an array of letter codes '''
+    m = max(len(codes) - n + 1, 0)
+    flat = codes[:m].copy()
+    for k in range(1, n):
+        flat = flat * 26 + codes[k:m + k]
+    return flat
+
+
+def quadgram_codes(codes):
+    return ngram_codes(codes, 4)
+
+
+class NgramModel:
+    ''' Letter 1..n_max-gram counts; n-gram a..z is at index sum(letter * 26^k) of counts(n) '''
+
+    def __init__(self, counts):
+        self._counts = [np.asarray(c) for c in counts]
+        self.n_max = len(self._counts)
+
+    @classmethod
+    def build(cls, sources, n_max=4, chunk_size=1 << 20):
+        ''' Counts n-grams over files (paths or binary file objects) in one streaming pass,
+            `chunk_size` bytes at a time. Letters are case-folded and everything else is
+            skipped, so n-grams run across spaces and punctuation (and across files) '''
+        if isinstance(sources, (str, bytes, os.PathLike)) or hasattr(sources, 'read'):
+            sources = [sources]
+        counts = [np.zeros(26 ** n, dtype=np.int64) for n in range(1, n_max + 1)]
+        tail = np.zeros(0, dtype=np.int64)  # last n_max - 1 letters of the previous chunk
+
+        for source in sources:
+            f = open(source, 'rb') if not hasattr(source, 'read') else source
+            try:
+                while True:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        break
+                    codes = encode_letters(chunk)
+                    for n in range(1, n_max + 1):
+                        # n-grams that end in this chunk
+                        window = np.concatenate((tail[max(len(tail) - n + 1, 0):], codes))
+                        counts[n - 1] += np.bincount(ngram_codes(window, n), minlength=26 ** n)
+                    tail = np.concatenate((tail, codes))
+                    tail = tail[max(len(tail) - n_max + 1, 0):]
+            finally:
+                if f is not source:
+                    f.close()
+        return cls(counts)
+
+    def save(self, path):
+        header = MAGIC + np.array([VERSION, self.n_max], dtype='<u4').tobytes()
+        with open(path, 'wb') as f:
+            f.write(header.ljust(HEADER_SIZE, b'\0'))
+            for counts in self._counts:
+                f.write(np.ascontiguousarray(counts, dtype='<i8').tobytes())
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        ''' Loads a model saved with save(); with mmap=True the counts stay on disk '''
+        with open(path, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE or header[:8] != MAGIC:
+            raise ValueError("Not an n-gram model file")
+        version, n_max = np.frombuffer(header[8:16], dtype='<u4')
+        if version != VERSION:
+            raise ValueError(f"Unsupported n-gram model version {version}")
+
+        sizes = [26 ** n for n in range(1, int(n_max) + 1)]
+        if mmap:
+            data = np.memmap(path, dtype='<i8', mode='r', offset=HEADER_SIZE, shape=(sum(sizes),))
+        else:
+            data = np.fromfile(path, dtype='<i8', offset=HEADER_SIZE)
+        if len(data) != sum(sizes):
+            raise ValueError("Truncated n-gram model file")
+        offsets = np.cumsum([0] + sizes)
+        return cls([data[offsets[i]:offsets[i + 1]] for i in range(len(sizes))])
+
+    def counts(self, n):
+        if not 1 <= n <= self.n_max:
+            raise ValueError(f"Model only has 1- to {self.n_max}-grams")
+        return self._counts[n - 1]
+
+    def probabilities(self, n):
+        counts = self.counts(n)
+        return counts / max(int(counts.sum()), 1)
+
+    def log_probabilities(self, n, floor=0.01):
+        ''' log10 probabilities of all n-grams; unseen ones count as `floor` occurrences '''
+        counts = self.counts(n)
+        return np.log10(np.maximum(counts, floor) / max(int(counts.sum()), 1))
+
+    def distribution(self):
+        ''' Letter distribution as an array of 26 probabilities '''
+        return self.probabilities(1)
+
+    def letter_distribution(self):
+        ''' Letter distribution as a dict, like the notebook's `letter_distribution` '''
+        return {char: float(p) for char, p in zip(alphabet, self.distribution()) if p}
+
+
+def default_model(corpus=CORPUS_PATH):
+    ''' The model of `corpus`, cached next to it as <corpus>.ngrams and rebuilt when the corpus changes '''
+    cache = os.path.splitext(corpus)[0] + '.ngrams'
+    try:
+        if os.path.getmtime(cache) >= os.path.getmtime(corpus):
+            return NgramModel.load(cache)
+    except (OSError, ValueError):
+        pass
+    model = NgramModel.build(corpus)
+    try:
+        model.save(cache)
+    except OSError:
+        pass
+    return model
@@ -0,0 +1,89 @@
+from classical import alphabet, letter_counts
+from concurrent.futures import ProcessPoolExecutor
+from ngrams import default_model, encode_letters, quadgram_codes
+import numpy as np
+
+
+def decryption_mapping(key):
+    ''' `mapping` for `substitution_decrypt` (plaintext letter -> ciphertext letter) from
+        a decryption key array (key[c] = plaintext code of ciphertext code c) '''
+    return {alphabet[p]: alphabet[c] for c, p in enumerate(key)}
+
+
+class SubstitutionScorer:
+    ''' Quadgram score of a ciphertext under decryption keys.
+
+        The ciphertext is reduced once to its distinct quadgrams and their counts, so
+        scoring never touches the text. Swapping two key letters only changes the
+        quadgrams that contain them, and only those are rescored. '''
+
+    def __init__(self, ciphertext, log_probabilities):
+        codes = quadgram_codes(encode_letters(ciphertext))
+        unique, self.counts = np.unique(codes, return_counts=True)
+        self.letters = np.stack([unique // 17576, unique // 676 % 26, unique // 26 % 26, unique % 26], axis=1)
+        self.table = log_probabilities
+        # quadgrams containing each ciphertext letter
+        self.members = [np.flatnonzero((self.letters == c).any(axis=1)) for c in range(26)]
+
+    def contributions(self, key, rows=slice(None)):
+        k = key[self.letters[rows]]
+        return self.counts[rows] * self.table[k[:, 0] * 17576 + k[:, 1] * 676 + k[:, 2] * 26 + k[:, 3]]
+
+    def score(self, key):
+        return float(self.contributions(key).sum())
+
+    def climb(self, key):
+        ''' Hill-climbs from `key` over all letter swaps until no swap improves the score.
+            Returns the final key and its score '''
+        key = np.array(key)
+        contributions = self.contributions(key)
+        improved = True
+        while improved:
+            improved = False
+            for i in range(26):
+                for j in range(i + 1, 26):
+                    rows = np.union1d(self.members[i], self.members[j])
+                    key[i], key[j] = key[j], key[i]
+                    new = self.contributions(key, rows)
+                    if new.sum() > contributions[rows].sum() + 1e-9:
+                        contributions[rows] = new
+                        improved = True
+                    else:
+                        key[i], key[j] = key[j], key[i]
+        return key, float(contributions.sum())
+
+
+def frequency_key(ciphertext, distribution):
+    ''' Decryption key pairing ciphertext letters with `distribution` (26 probabilities) by rank '''
+    key = np.empty(26, dtype=np.int64)
+    key[np.argsort(-letter_counts(ciphertext), kind='stable')] = np.argsort(-np.asarray(distribution), kind='stable')
+    return key
+
+
+def _restarts(ciphertext, log_probabilities, starts):
+    scorer = SubstitutionScorer(ciphertext, log_probabilities)
+    return [scorer.climb(key) for key in starts]
+
+
+def solve_substitution(ciphertext, log_probabilities=None, restarts=16, seed=None, workers=None, distribution=None):
+    ''' Recovers a simple substitution key by hill climbing from several starting keys: one
+        matched on letter frequencies (when `distribution` is given) and random permutations.
+        Returns (`mapping`, score) with `mapping` as expected by `substitution_decrypt` '''
+    if log_probabilities is None:
+        log_probabilities = default_model().log_probabilities(4)
+
+    rng = np.random.default_rng(seed)
+    starts = [rng.permutation(26) for _ in range(restarts)]
+    if distribution is not None:
+        starts[0] = frequency_key(ciphertext, distribution)
+
+    if workers is None or workers <= 1:
+        results = _restarts(ciphertext, log_probabilities, starts)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            batches = [starts[i::workers] for i in range(workers)]
+            futures = [executor.submit(_restarts, ciphertext, log_probabilities, batch) for batch in batches if batch]
+            results = [result for future in futures for result in future.result()]
+
+    key, score = max(results, key=lambda result: result[1])
+    return decryption_mapping(key), score
@@ -0,0 +1,169 @@
+from bits import Bits
+from lfsr import LFSR
+from bitgenerator import AlternatingStep
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import time
+
+
+# attack installed in each pool process by _init_worker
+_worker_attack = None
+
+
+def _init_worker(attack):
+    global _worker_attack
+    _worker_attack = attack
+
+
+def _search_in_worker(start, stop):
+    return list(_worker_attack.search(start, stop))
+
+
+def output_masks(poly, n):
+    """Returns n masks over the initial state of an LFSR with feedback polynomial poly:
+    the output after k clocks is the parity of masks[k] & state (packed as in LFSR).
+
+    The state after k clocks holds outputs k .. k+L-1, so the first L masks are the
+    unit vectors and the rest follow the LFSR recurrence itself."""
+    lfsr = LFSR(poly)
+    length, poly_mask = lfsr.length, int(lfsr.poly_bits)
+    taps = [p for p in range(length) if poly_mask >> p & 1]
+    masks = [1 << p for p in range(min(n, length))]
+    for k in range(n - len(masks)):
+        m = 0
+        for p in taps:
+            m ^= masks[k + p]
+        masks.append(m)
+    return masks
+
+
+class AlternatingStepAttack:
+    """Known-keystream seed recovery for AlternatingStep by guessing the control register.
+
+    Once the control state is fixed, every keystream bit is the XOR of one output of
+    lfsr0 and one of lfsr1, i.e. a linear equation in their L0 + L1 initial state bits.
+    Each guess is checked by Gaussian elimination that stops at the first inconsistent
+    equation, so the 2^(LC+L0+L1) search becomes 2^LC small linear systems. Surviving
+    seeds are confirmed by regenerating the whole keystream.
+    """
+
+    # control states handed to a pool process at a time
+    chunk_size = 1 << 12
+
+    def __init__(self, keystream, polyC={5, 2, 0}, poly0={3, 1, 0}, poly1={4, 1, 0}, equations=None):
+        self.keystream = Bits(keystream)
+        self.polyC, self.poly0, self.poly1 = set(polyC), set(poly0), set(poly1)
+        self.lengths = (max(self.polyC), max(self.poly0), max(self.poly1))
+        unknowns = self.lengths[1] + self.lengths[2]
+        if len(self.keystream) < unknowns:
+            raise ValueError("Keystream is shorter than the lfsr0 and lfsr1 states")
+
+        # each register is clocked about every other step, so twice the unknowns plus a margin
+        if equations is None:
+            equations = 2 * unknowns + 32
+        self.equations = min(equations, len(self.keystream))
+        self._rhs = [int(b) for b in self.keystream[:self.equations]]
+        self._masks0 = output_masks(self.poly0, self.equations + 1)
+        self._masks1 = output_masks(self.poly1, self.equations + 1)
+
+    def seed(self, control, state0, state1):
+        """Returns the AlternatingStep seed for packed register states."""
+        lc, l0, l1 = self.lengths
+        return Bits((control << (l0 + l1)) | (state0 << l1) | state1, lc + l0 + l1)
+
+    def _control_bits(self, lfsr, control):
+        lfsr.state = Bits(control, lfsr.length)
+        n = self.equations
+        value = int.from_bytes(lfsr.run_bytes((n + 7) // 8), 'big')
+        return [(value >> (8 * ((n + 7) // 8) - 1 - j)) & 1 for j in range(n)]
+
+    def solve(self, control, lfsr=None):
+        """Yields every (state0, state1) consistent with the keystream for a control state."""
+        if lfsr is None:
+            lfsr = LFSR(self.polyC)
+        l1 = self.lengths[2]
+        masks0, masks1 = self._masks0, self._masks1
+
+        pivots = {}
+        clocks0 = clocks1 = 0
+        for c, z in zip(self._control_bits(lfsr, control), self._rhs):
+            if c:
+                clocks1 += 1
+            else:
+                clocks0 += 1
+            row = (masks0[clocks0] << l1) | masks1[clocks1]
+            while row:
+                top = row.bit_length() - 1
+                pivot = pivots.get(top)
+                if pivot is None:
+                    pivots[top] = (row, z)
+                    break
+                row ^= pivot[0]
+                z ^= pivot[1]
+            if not row and z:
+                return
+
+        # free unknowns are enumerated, pivots solved from the lowest bit up
+        unknowns = self.lengths[1] + l1
+        free = [bit for bit in range(unknowns) if bit not in pivots]
+        for assignment in range(1 << len(free)):
+            solution = 0
+            for i, bit in enumerate(free):
+                if assignment >> i & 1:
+                    solution |= 1 << bit
+            for top in sorted(pivots):
+                row, z = pivots[top]
+                if (z ^ (row & solution & ~(1 << top)).bit_count()) & 1:
+                    solution |= 1 << top
+            yield solution >> l1, solution & ((1 << l1) - 1)
+
+    def verify(self, seed):
+        polys = (self.polyC, self.poly0, self.poly1)
+        return AlternatingStep(seed, *polys).run(len(self.keystream)) == self.keystream
+
+    def search(self, start=0, stop=None):
+        """Yields the seeds with control state in [start, stop) that reproduce the keystream."""
+        if stop is None:
+            stop = 1 << self.lengths[0]
+        lfsr = LFSR(self.polyC)
+        for control in range(start, stop):
+            for state0, state1 in self.solve(control, lfsr):
+                seed = self.seed(control, state0, state1)
+                if self.verify(seed):
+                    yield seed
+
+    def run(self, workers=None, progress=None):
+        """Searches the whole control space and returns the matching seeds.
+
+        With workers > 1 the space is split into chunk_size ranges over a process pool.
+        progress(done, total, rate) is called after every range with the number of
+        control states checked so far and the states per second."""
+        total = 1 << self.lengths[0]
+        ranges = [(i, min(i + self.chunk_size, total)) for i in range(0, total, self.chunk_size)]
+        seeds = []
+        done = 0
+        started = time.perf_counter()
+
+        def report(start, stop):
+            nonlocal done
+            done += stop - start
+            if progress is not None:
+                elapsed = time.perf_counter() - started
+                progress(done, total, done / elapsed if elapsed else float('inf'))
+
+        if workers is None or workers <= 1:
+            for start, stop in ranges:
+                seeds.extend(self.search(start, stop))
+                report(start, stop)
+            return seeds
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self,)) as executor:
+            futures = {executor.submit(_search_in_worker, start, stop): (start, stop) for start, stop in ranges}
+            for future in as_completed(futures):
+                seeds.extend(future.result())
+                report(*futures[future])
+        return sorted(seeds, key=int)
+
+
+def recover_seed(keystream, polyC={5, 2, 0}, poly0={3, 1, 0}, poly1={4, 1, 0}, workers=None, progress=None):
+    """Returns the AlternatingStep seeds that generate keystream (as run() output)."""
+    return AlternatingStepAttack(keystream, polyC, poly0, poly1).run(workers, progress)
@@ -1,7 +1,20 @@
 from lfsr import LFSR
 from bits import Bits
+import numpy as np
+
+
+def _bit_array(lfsr, n):
+    """Clocks lfsr n times and returns its outputs as a uint8 array of 0/1."""
+    if n == 0:
+        return np.zeros(0, dtype=np.uint8)
+    data = np.frombuffer(lfsr.run_steps(n).to_bytes(), dtype=np.uint8)
+    return np.unpackbits(data)[-n:]
+
 
 class AlternatingStep:
+    # output bits per vectorised batch in run/run_bytes
+    batch_bits = 1 << 20
+
     def __init__(self, seed=None, polyC={5, 2, 0}, poly0={3, 1, 0}, poly1={4, 1, 0}):
         
         if seed is None:
@@ -35,7 +48,49 @@ class AlternatingStep:
 
     def run(self, N):
         """Returns the next N bits of the bit-generator (current output is not included)."""
-        output_sequence = []
-        for _ in range(N):
-            output_sequence.append(next(self))
-        return Bits(output_sequence)
\ No newline at end of file
+        value = 0
+        for i in range(0, N, self.batch_bits):
+            k = min(self.batch_bits, N - i)
+            packed = np.packbits(self._run_array(k)).tobytes()
+            value = (value << k) | (int.from_bytes(packed, 'big') >> (-k % 8))
+        return Bits(value, N)
+
+    def _run_array(self, N):
+        """Next N output bits as a uint8 array. Each register runs on its own in bulk;
+        output j is x[a_j] ^ y[b_j], where a_j/b_j count how often lfsr0/lfsr1 have been clocked."""
+        if N == 0:
+            return np.zeros(0, dtype=np.uint8)
+        control = _bit_array(self.lfsrC, N)
+        clocks1 = np.cumsum(control, dtype=np.int64)
+        clocks0 = np.arange(1, N + 1) - clocks1
+        count1 = int(clocks1[-1])
+
+        # seq[k] is the register output after k clocks
+        seq0 = np.concatenate(([self.lfsr0.output], _bit_array(self.lfsr0, N - count1))).astype(np.uint8)
+        seq1 = np.concatenate(([self.lfsr1.output], _bit_array(self.lfsr1, count1))).astype(np.uint8)
+        out = seq0[clocks0] ^ seq1[clocks1]
+        self.output = bool(out[-1])
+        return out
+
+    def run_bytes(self, n):
+        """Returns the next 8 * n output bits packed MSB-first into n bytes."""
+        out = bytearray(n)
+        step = self.batch_bits // 8
+        for i in range(0, n, step):
+            k = min(step, n - i)
+            out[i:i+k] = np.packbits(self._run_array(8 * k)).tobytes()
+        return bytes(out)
+
+    def encrypt_stream(self, fileobj_in, fileobj_out, chunk_size=1 << 16):
+        """XORs the keystream into everything read from fileobj_in and writes it to
+        fileobj_out, chunk by chunk. Returns the number of bytes processed."""
+        buffer = bytearray(chunk_size)
+        total = 0
+        while True:
+            n = fileobj_in.readinto(buffer)
+            if not n:
+                break
+            keystream = np.frombuffer(self.run_bytes(n), dtype=np.uint8)
+            fileobj_out.write((np.frombuffer(buffer, dtype=np.uint8, count=n) ^ keystream).tobytes())
+            total += n
+        return total
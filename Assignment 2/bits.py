@@ -1,106 +1,304 @@
+from mmap import mmap as _mmap, ACCESS_READ
+import operator
+
+
+def _as_index(index, name):
+    """Any integer a list would accept as an index (int, bool, NumPy integers) as an int."""
+    try:
+        return operator.index(index)
+    except TypeError:
+        raise TypeError(f"{name} indices must be integers or slices, not {type(index).__name__}") from None
+
+
 class Bits:
-    
+    """Bit string packed into a Python int: index 0 is the most significant bit."""
+
     def __init__(self, value, length=None):
         if type(value) is int:
             if value < 0:
                 raise ValueError("Negative integer value")
-            bin_str = bin(value)[2:]
+            n = max(value.bit_length(), 1)
             if length:
-                bin_str = bin_str.zfill(length)
-            self.bits = [bit == '1' for bit in bin_str]    
+                n = max(n, length)
         elif type(value) is bytes:
-            bit_str = ''.join(format(byte, '08b') for byte in value)
-            self.bits = [bit == '1' for bit in bit_str]     
-        else:  
-            self.bits = [bool(b) for b in value]
-            
-        if length is not None:
-                self.bits = self.bits[:length]
-    
+            n = 8 * len(value)
+            value = int.from_bytes(value, 'big')
+        elif type(value) is Bits:
+            n = value._length
+            value = value._value
+        else:
+            bit_str = ''.join(['1' if b else '0' for b in value])
+            n = len(bit_str)
+            value = int(bit_str, 2) if bit_str else 0
+
+        if length is not None and length < n:
+            # keep the leftmost `length` bits
+            value >>= n - length
+            n = length
+        self._value = value
+        self._length = n
+
+    @classmethod
+    def _make(cls, value, length):
+        bits = cls.__new__(cls)
+        bits._value = value
+        bits._length = length
+        return bits
+
+    @property
+    def bits(self):
+        return [bit == '1' for bit in str(self)]
+
+    @bits.setter
+    def bits(self, bits):
+        other = Bits(bits)
+        self._value = other._value
+        self._length = other._length
+
     def __getitem__(self, index):
+        n = self._length
         if isinstance(index, slice):
-            return Bits(self.bits[index])
-        elif type(index) is int:
-            if index < 0:
-                index += len(self.bits)
-            if index < 0 or index >= len(self.bits):
-                raise IndexError("Index out of range")
-        return self.bits[index]
-    
+            start, stop, step = index.indices(n)
+            if step != 1:
+                return Bits._from_str(str(self)[index])
+            if stop <= start:
+                return Bits._make(0, 0)
+            return Bits._make((self._value >> (n - stop)) & ((1 << (stop - start)) - 1), stop - start)
+        index = _as_index(index, "Bits")
+        if index < 0:
+            index += n
+        if index < 0 or index >= n:
+            raise IndexError("Index out of range")
+        return (self._value >> (n - 1 - index)) & 1 == 1
+
     def __setitem__(self, index, value):
-        self.bits[index] = bool(value)
-    
-    def parity_bit(self):   
-        return sum(self.bits) % 2 == 1
-    
+        n = self._length
+        index = _as_index(index, "Bits")
+        if index < 0:
+            index += n
+        if index < 0 or index >= n:
+            raise IndexError("Index out of range")
+        mask = 1 << (n - 1 - index)
+        self._value = self._value | mask if value else self._value & ~mask
+
+    def __iter__(self):
+        for bit in str(self):
+            yield bit == '1'
+
+    def __int__(self):
+        return self._value
+
+    def parity_bit(self):
+        return self._value.bit_count() & 1 == 1
+
     def __len__(self):
-        return len(self.bits)
-    
+        return self._length
+
     def __str__(self):
-        return ''.join(['1' if bit else '0' for bit in self.bits])
-    
+        return format(self._value, f'0{self._length}b') if self._length else ''
+
     def __repr__(self):
-        return f"Bits({''.join(['1' if bit else '0' for bit in self.bits])})"
-    
+        return f"Bits({str(self)})"
+
     def append(self, bit):
-        self.bits.append(bool(bit))
-    
+        self._value = (self._value << 1) | (1 if bit else 0)
+        self._length += 1
+
     def pop(self, index=-1):
-        return self.bits.pop(index)
-    
+        n = self._length
+        if n == 0:
+            raise IndexError("pop from empty Bits")
+        index = _as_index(index, "Bits")
+        if index < 0:
+            index += n
+        if index < 0 or index >= n:
+            raise IndexError("pop index out of range")
+        low_len = n - 1 - index
+        bit = (self._value >> low_len) & 1 == 1
+        self._value = ((self._value >> (low_len + 1)) << low_len) | (self._value & ((1 << low_len) - 1))
+        self._length -= 1
+        return bit
+
     def __xor__(self, other):
         if len(self) != len(other):
             raise ValueError("Bit strings must be of the same length")
-        return Bits([a ^ b for a, b in zip(self.bits, other.bits)])
-    
+        return Bits._make(self._value ^ other._value, self._length)
+
     def __and__(self, other):
         if len(self) != len(other):
             raise ValueError("Bit strings must be of the same length")
-        return Bits([a & b for a, b in zip(self.bits, other.bits)])
-    
+        return Bits._make(self._value & other._value, self._length)
+
     def __add__(self, other):
-        return Bits(self.bits + other.bits)
-    
+        return Bits._make((self._value << other._length) | other._value, self._length + other._length)
+
     def __mul__(self, scalar):
         if type(scalar) != int or scalar < 0:
             raise ValueError("Can only multiply by a non-negative integer")
-        return Bits(self.bits * scalar)
-    
+        return Bits._from_str(str(self) * scalar)
+
     def __eq__(self, other):
         if type(other) is not Bits:
             raise ValueError("Can only compare with another Bits object")
-        return self.bits == other.bits
+        return self._length == other._length and self._value == other._value
 
     def to_bytes(self):
-        pad_len = (8 - len(self.bits) % 8) % 8
-        padded = [False] * pad_len + self.bits  # pad left for MSB-first
-        return bytes(
-            int(''.join(str(int(b)) for b in padded[i:i+8]), 2)
-            for i in range(0, len(padded), 8)
-        )
-    
+        # pad left for MSB-first
+        return self._value.to_bytes((self._length + 7) // 8, 'big')
+
     def pad_left(self, length):
         if length < 0:
             raise ValueError("Length must be non-negative")
-        self.bits = [False] * length + self.bits
+        self._length += length
         return self
 
     def pad_right(self, length):
         if length < 0:
             raise ValueError("Length must be non-negative")
-        self.bits = self.bits + [False] * length
+        self._value <<= length
+        self._length += length
         return self
-    
+
     def copy(self):
-        return Bits(self.bits[:])
-    
+        return Bits._make(self._value, self._length)
+
+    @staticmethod
+    def _from_str(bit_str):
+        return Bits._make(int(bit_str, 2) if bit_str else 0, len(bit_str))
+
+    @staticmethod
+    def from_file(path, mmap=False):
+        """Reads a file as Bits, or with mmap=True returns a read-only BitsView of the mapped file."""
+        if mmap:
+            return BitsView.open(path)
+        with open(path, 'rb') as f:
+            return Bits(f.read())
+
+
+class BitsView:
+    """Read-only, zero-copy view of `length` bits of a buffer starting at bit `offset`.
+
+    Slicing returns another view of the same buffer, so multi-GB files opened
+    with BitsView.open (memory-mapped) are never loaded as a whole. Views
+    become invalid once the file is closed.
+    """
+
+    # bytes handled per step by iteration and xor
+    chunk_size = 1 << 20
+
+    def __init__(self, buffer, offset=0, length=None):
+        self._buffer = memoryview(buffer).cast('B')
+        self._offset = offset
+        self._length = 8 * len(self._buffer) - offset if length is None else length
+        self._source = None
+        if offset < 0 or self._length < 0 or offset + self._length > 8 * len(self._buffer):
+            raise ValueError("View exceeds the buffer")
+
+    @classmethod
+    def open(cls, path):
+        f = open(path, 'rb')
+        try:
+            mapped = _mmap(f.fileno(), 0, access=ACCESS_READ)
+        except ValueError:  # empty files cannot be mapped
+            f.close()
+            return cls(b'')
+        view = cls(mapped)
+        view._source = (f, mapped)
+        return view
+
+    @classmethod
+    def from_bits(cls, bits):
+        return cls(bits.to_bytes(), (8 - len(bits) % 8) % 8, len(bits))
+
+    def close(self):
+        if self._source is not None:
+            f, mapped = self._source
+            self._buffer.release()
+            mapped.close()
+            f.close()
+            self._source = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self._length
+
+    def _int(self, start, nbits):
+        """Returns bits [start, start + nbits) of the view as an int."""
+        if nbits == 0:
+            return 0
+        begin = self._offset + start
+        end = begin + nbits
+        value = int.from_bytes(self._buffer[begin // 8:(end + 7) // 8], 'big')
+        return (value >> (-end % 8)) & ((1 << nbits) - 1)
+
+    def __getitem__(self, index):
+        n = self._length
+        if isinstance(index, slice):
+            start, stop, step = index.indices(n)
+            if step != 1:
+                return self.to_bits()[index]
+            view = BitsView.__new__(BitsView)
+            view._buffer = self._buffer
+            view._offset = self._offset + start
+            view._length = max(stop - start, 0)
+            view._source = None
+            return view
+        index = _as_index(index, "BitsView")
+        if index < 0:
+            index += n
+        if index < 0 or index >= n:
+            raise IndexError("Index out of range")
+        bit = self._offset + index
+        return (self._buffer[bit // 8] >> (7 - bit % 8)) & 1 == 1
+
+    def __iter__(self):
+        step = 8 * self.chunk_size
+        for start in range(0, self._length, step):
+            nbits = min(step, self._length - start)
+            for bit in format(self._int(start, nbits), f'0{nbits}b'):
+                yield bit == '1'
+
+    def to_bits(self):
+        return Bits._make(self._int(0, self._length), self._length)
+
+    def to_bytes(self):
+        return self.to_bits().to_bytes()
+
+    def xor(self, other, out=None):
+        """XORs with another view (or Bits) of the same length into `out`, a writable
+        buffer of at least ceil(len / 8) bytes, allocated if not given. The result
+        is packed MSB-first from the start of `out`, zero-padded on the right."""
+        if isinstance(other, Bits):
+            other = BitsView.from_bits(other)
+        if len(self) != len(other):
+            raise ValueError("Bit strings must be of the same length")
+        n = self._length
+        if out is None:
+            out = bytearray((n + 7) // 8)
+        target = memoryview(out).cast('B')
+        if len(target) < (n + 7) // 8:
+            raise ValueError("Output buffer is too small")
+
+        step = 8 * self.chunk_size
+        for start in range(0, n, step):
+            nbits = min(step, n - start)
+            value = (self._int(start, nbits) ^ other._int(start, nbits)) << (-nbits % 8)
+            nbytes = (nbits + 7) // 8
+            target[start // 8:start // 8 + nbytes] = value.to_bytes(nbytes, 'big')
+        return out
+
+    def __repr__(self):
+        return f"BitsView(offset={self._offset}, length={self._length})"
+
+
 def polynomial_to_bits(degrees):
     """ input polnomial degress: {5, 3, 0}
         output bits: {1, 0, 1, 0, 0, 1} -> {p_1, ..., p_m-1, p_m}"""
     max_deg = max(degrees)
     bit_list = [1 if i in degrees else 0 for i in range(max_deg+1)]
     return Bits(bit_list)
-    
-
-
-
@@ -1,4 +1,6 @@
-from bits import Bits, polynomial_to_bits
+from bits import Bits, BitsView, polynomial_to_bits
+from functools import lru_cache
+import math
 
 class LFSR:
     
@@ -6,100 +8,403 @@ class LFSR:
         self.poly = set(poly) 
         self.length = max(self.poly)
         self.poly_bits = polynomial_to_bits(self.poly)[1:] # ignore p_0
+        self._mask = int(self.poly_bits)  # taps on the packed state, state[0] is the top bit
+        # characteristic polynomial x^L + p_1 x^(L-1) + ... + p_L, bit i is the coefficient of x^i
+        self._charpoly = sum(1 << (self.length - i) for i in self.poly if i > 0) | (1 << self.length)
 
         if state is None:
             self.state = Bits([1] * self.length)
-        elif type(state) is Bits:
-            self.state = Bits(state.bits[:self.length])
         else:
-            self.state = Bits(state, length=self.length)
+            self.state = state
 
         self.output = self.state[-1]
         self.feedback = (self.poly_bits & self.state).parity_bit()
 
+    @property
+    def state(self):
+        return Bits(self._state, self.length)
+
+    @state.setter
+    def state(self, state):
+        if type(state) is not Bits:
+            state = Bits(state, length=self.length)
+        self._state = int(state[:self.length])
+
     def __iter__(self):
         return self
 
     def __next__(self):
-        self.feedback = (self.poly_bits & self.state).parity_bit()
-        self.state = Bits([self.feedback]) + self.state[:-1]
-        self.output = self.state[-1]
+        s = self._state
+        feedback = (s & self._mask).bit_count() & 1
+        s = (feedback << (self.length - 1)) | (s >> 1)
+        self._state = s
+        self.feedback = feedback == 1
+        self.output = s & 1 == 1
         return self.output
 
-    def run_steps(self, N=1, state=None):
-        """Returns the next N bits of the LFSR starting from the next state."""
+    def run_steps(self, N=1, state=None, skip=0):
+        """Returns the next N bits of the LFSR starting from the next state,
+        after jumping `skip` steps ahead."""
         if state is not None:
-            if type(state) is Bits:
-                self.state = Bits(state.bits[:self.length])
-            else:
-                self.state = Bits(state, length=self.length)
+            self.state = state
+        if skip:
+            self.jump(skip)
 
-        output_bits = []
-        for i in range(N):
-            output_bits.append(next(self))
-        return Bits(output_bits)
+        value = int.from_bytes(self.run_bytes(N // 8), 'big')
+        for _ in range(N % 8):
+            value = (value << 1) | next(self)
+        return Bits(value, N)
 
-    def cycle(self, state=None):
-        """Returns the cycle of the LFSR starting from the next state."""
+    def run_bytes(self, n):
+        """Returns the next 8 * n output bits packed MSB-first into n bytes,
+        advancing the register a byte at a time through precomputed tables."""
+        if n <= 0:
+            return b''
+        tables = _byte_tables(self._mask, self.length)
+        width = len(tables)
+        s = self._state
+        out = bytearray(n)
+        if width == 1:
+            table = tables[0]
+            for i in range(n):
+                v = table[s]
+                out[i] = v & 0xFF
+                s = v >> 8
+        else:
+            for i in range(n):
+                v = 0
+                for table, b in zip(tables, s.to_bytes(width, 'little')):
+                    v ^= table[b]
+                out[i] = v & 0xFF
+                s = v >> 8
+
+        self._state = s
+        self.feedback = (s >> (self.length - 1)) & 1 == 1
+        self.output = s & 1 == 1
+        return bytes(out)
+
+    def jump(self, n):
+        """Advances the register by n steps in O(L^2 log n): with r(x) = x^n mod C(x) for the
+        characteristic polynomial C, the state after n steps is r(A) applied to the current one."""
+        if n < 0:
+            raise ValueError("Can only jump forward")
+        if n == 0:
+            return self
+        s = self._advance(self._state, n)
+        self._state = s
+        self.feedback = (s >> (self.length - 1)) & 1 == 1
+        self.output = s & 1 == 1
+        return self
+
+    def _advance(self, s, n):
+        """Returns the packed state n steps after s."""
+        r = _gf2_pow_x(n, self._charpoly, self.length)
+
+        # combine A^i s for the coefficients of r
+        mask, length = self._mask, self.length
+        result = 0
+        while r:
+            if r & 1:
+                result ^= s
+            r >>= 1
+            feedback = (s & mask).bit_count() & 1
+            s = (feedback << (length - 1)) | (s >> 1)
+        return result
+
+    def period(self, state=None):
+        """Returns the period of the sequence from the current (or given) state without
+        enumerating it: the period divides the order of x modulo C(x), which is built from
+        2^d - 1 for the degrees d of the irreducible factors of C, so only those numbers
+        are factored and the candidate is reduced prime by prime."""
         if state is not None:
-            if type(state) is Bits:
-                self.state = Bits(state.bits[:self.length])
-            else:
-                self.state = Bits(state, length=self.length)
-    
-        seen_states = set()
-        output_bits = []
+            self.state = state
+        s = self._state
+        if s == 0:
+            return 1
 
-        while True:
-            next_bit = next(self)
-            state_tuple = tuple(self.state.bits)
-            if state_tuple in seen_states:
-                break
-            seen_states.add(state_tuple)
+        primes = set()
+        degrees, multiplicity = _factor_degrees(self._charpoly)
+        period = 1
+        for d in degrees:
+            period = math.lcm(period, (1 << d) - 1)
+            primes.update(_mersenne_factors(d))
+        while multiplicity > 1:
+            # repeated factors multiply the order by a power of two
+            period *= 2
+            primes.add(2)
+            multiplicity = (multiplicity + 1) // 2
+
+        for q in sorted(primes):
+            while period % q == 0 and self._advance(s, period // q) == s:
+                period //= q
+        return period
+
+    def run_words(self, n, word_size=64):
+        """Returns the next n words of output as ints, first output bit in the most significant position."""
+        if word_size % 8:
+            raise ValueError("Word size must be a multiple of 8")
+        step = word_size // 8
+        data = self.run_bytes(n * step)
+        return [int.from_bytes(data[i:i+step], 'big') for i in range(0, len(data), step)]
 
-            output_bits.append(next_bit)
+    def cycle(self, state=None):
+        """Returns the cycle of the LFSR starting from the next state."""
+        if state is not None:
+            self.state = state
 
-        return Bits(output_bits)
+        # one full period brings the register back to where it started
+        return self.run_steps(self.period())
 
     def __str__(self):
         return f"LFSR(state={str(self.state)}, poly={self.poly})"
     
     
-def berlekamp_massey(bits):
-    N = len(bits)
-    P = Bits([1])              # feedback polynomial of LFSR -> leftmost bit is x^0
-    Q = Bits([1])              # Q(x)
-    m = 0                      # degree of P(x)
-    r = 1                      
-
-    for t in range(N):
-        # compute discrepancy d
+def _gf2_mulmod(a, b, modulus, degree):
+    """Product of two GF(2) polynomials (as ints) modulo a polynomial of the given degree."""
+    result = 0
+    while b:
+        if b & 1:
+            result ^= a
+        b >>= 1
+        a <<= 1
+        if (a >> degree) & 1:
+            a ^= modulus
+    return result
+
+
+def _gf2_pow_x(n, modulus, degree):
+    """x^n modulo a polynomial of the given degree, by square-and-multiply."""
+    result = 1
+    base = 2 if degree > 1 else 2 ^ modulus
+    while n:
+        if n & 1:
+            result = _gf2_mulmod(result, base, modulus, degree)
+        base = _gf2_mulmod(base, base, modulus, degree)
+        n >>= 1
+    return result
+
+
+def _gf2_divmod(a, b):
+    """Quotient and remainder of GF(2) polynomials (as ints)."""
+    q = 0
+    db = b.bit_length()
+    while a.bit_length() >= db:
+        shift = a.bit_length() - db
+        q ^= 1 << shift
+        a ^= b << shift
+    return q, a
+
+
+def _gf2_gcd(a, b):
+    while b:
+        a, b = b, _gf2_divmod(a, b)[1]
+    return a
+
+
+def _squarefree_parts(f):
+    """Square-free factorisation over GF(2): list of (g, m) with f = prod g^m."""
+    parts = []
+    even_mask = int('01' * (f.bit_length() // 2 + 1), 2)
+    c = _gf2_gcd(f, (f >> 1) & even_mask)  # f' keeps the odd-degree terms, shifted down
+    w = _gf2_divmod(f, c)[0]
+    i = 1
+    while w != 1:
+        y = _gf2_gcd(w, c)
+        z = _gf2_divmod(w, y)[0]
+        if z != 1:
+            parts.append((z, i))
+        i += 1
+        w = y
+        c = _gf2_divmod(c, y)[0]
+    if c != 1:
+        # what is left is a perfect square: take its square root
+        root = 0
+        for k in range(0, c.bit_length(), 2):
+            root |= ((c >> k) & 1) << (k // 2)
+        parts.extend((g, 2 * m) for g, m in _squarefree_parts(root))
+    return parts
+
+
+def _factor_degrees(f):
+    """Returns the degrees of the irreducible factors of f and the largest multiplicity,
+    by distinct-degree factorisation of each square-free part."""
+    degrees = set()
+    multiplicity = 1
+    for g, m in _squarefree_parts(f):
+        multiplicity = max(multiplicity, m)
+        h = 2  # x^(2^d) mod g
         d = 0
-        for i in range(len(P)):
-            if t - i >= 0:
-                d ^= P[i] & bits[t - i]
-
-        if d == 1:
-            if 2 * m <= t:
-                R = P.copy()
-                shifted_Q = Q.copy().pad_left(r)  # left shift Q by r
-                # equalize lengths
-                max_len = max(len(P), len(shifted_Q))
-                P = P.pad_right(max_len - len(P))
-                shifted_Q = shifted_Q.pad_right(max_len - len(shifted_Q))
-                P = P ^ shifted_Q
-                Q = R
-                m = t + 1 - m
-                r = 0
-            else:
-                shifted_Q = Q.copy().pad_left(r)  # left shift Q by r
-                max_len = max(len(P), len(shifted_Q))
-                P = P.pad_right(max_len - len(P))
-                shifted_Q = shifted_Q.pad_right(max_len - len(shifted_Q))
-                P = P ^ shifted_Q
+        while g.bit_length() - 1 >= 2 * (d + 1):
+            d += 1
+            h = _gf2_mulmod(h, h, g, g.bit_length() - 1)
+            common = _gf2_gcd(g, h ^ 2)
+            if common != 1:
+                degrees.add(d)
+                g = _gf2_divmod(g, common)[0]
+                h = _gf2_divmod(h, g)[1]
+        if g != 1:
+            degrees.add(g.bit_length() - 1)
+    return degrees, multiplicity
+
 
+def _is_probable_prime(n):
+    if n < 2:
+        return False
+    bases = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)  # deterministic below 3.3e24
+    for p in bases:
+        if n % p == 0:
+            return n == p
+    d, r = n - 1, 0
+    while d % 2 == 0:
+        d //= 2
         r += 1
+    for a in bases:
+        x = pow(a, d, n)
+        if x in (1, n - 1):
+            continue
+        for _ in range(r - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def _pollard_rho(n):
+    """Returns a non-trivial factor of the composite n (Brent's variant)."""
+    if n % 2 == 0:
+        return 2
+    c = 1
+    while True:
+        y, m, g, r, q = 2, 128, 1, 1, 1
+        while g == 1:
+            x = y
+            for _ in range(r):
+                y = (y * y + c) % n
+            k = 0
+            while k < r and g == 1:
+                ys = y
+                for _ in range(min(m, r - k)):
+                    y = (y * y + c) % n
+                    q = q * abs(x - y) % n
+                g = math.gcd(q, n)
+                k += m
+            r *= 2
+        if g == n:
+            g = 1
+            while g == 1:
+                ys = (ys * ys + c) % n
+                g = math.gcd(abs(x - ys), n)
+        if g != n:
+            return g
+        c += 1
+
+
+def _factorize(n):
+    """Returns the prime factors of n with multiplicity."""
+    if n == 1:
+        return []
+    if _is_probable_prime(n):
+        return [n]
+    d = _pollard_rho(n)
+    return _factorize(d) + _factorize(n // d)
+
 
-    return {i for i, bit in enumerate(P) if bit}
+@lru_cache(maxsize=None)
+def _mersenne_factors(length):
+    return sorted(_factorize((1 << length) - 1))
 
 
+@lru_cache(maxsize=64)
+def _byte_tables(mask, length):
+    """Tables for eight steps at once: XOR-ing tables[j][byte j of the state]
+    gives (state after 8 steps) << 8 | (the 8 output bits)."""
+    def step8(s):
+        out = 0
+        for _ in range(8):
+            feedback = (s & mask).bit_count() & 1
+            s = (feedback << (length - 1)) | (s >> 1)
+            out = (out << 1) | (s & 1)
+        return (s << 8) | out
+
+    full = (1 << length) - 1
+    tables = []
+    for j in range((length + 7) // 8):
+        # eight steps are linear in the state, so build each table from its bit columns
+        columns = [step8((1 << (8 * j + k)) & full) for k in range(8)]
+        table = [0] * 256
+        for b in range(1, 256):
+            low = b & -b
+            table[b] = table[b ^ low] ^ columns[low.bit_length() - 1]
+        tables.append(table)
+    return tables
+
+
+class BerlekampMassey:
+    """Online Berlekamp-Massey over packed ints.
+
+    feed() takes the sequence in chunks and returns the linear complexity so far,
+    so a stream can be abandoned once it stops growing. P and Q hold polynomial
+    coefficients with bit i for x^i, and the window holds s_(t-i) in bit i, so each
+    discrepancy is the parity of P & window.
+    """
+
+    def __init__(self):
+        self.P = 1                  # feedback polynomial, bit i is the coefficient of x^i
+        self.Q = 1
+        self.linear_complexity = 0
+        self.length = 0             # bits consumed so far
+        self._r = 1
+        self._history = []          # every chunk fed so far as a bit string, joined only when the window grows
+        self._history_length = 0
+        self._window = 0
+        self._width = 64            # bits kept in the window, always above the degree of P
+
+    def feed(self, bits):
+        if type(bits) is not Bits:
+            bits = bits.to_bits() if isinstance(bits, BitsView) else Bits(bits)
+        chunk = str(bits)
+        self._history.append(chunk)
+        self._history_length += len(bits)
+
+        P, Q, m, r, t = self.P, self.Q, self.linear_complexity, self._r, self.length
+        window, width = self._window, self._width
+        window_mask = (1 << width) - 1
+        for bit in chunk:
+            window = ((window << 1) | (bit == '1')) & window_mask
+            if (P & window).bit_count() & 1:
+                if 2 * m <= t:
+                    P, Q = P ^ (Q << r), P
+                    m = t + 1 - m
+                    r = 0
+                    if m >= width:
+                        # grow the window geometrically and refill it from the history
+                        width = 2 * m + 64
+                        window_mask = (1 << width) - 1
+                        window = (self._joined_history() >> (self._history_length - 1 - t)) & window_mask
+                else:
+                    P ^= Q << r
+            r += 1
+            t += 1
+
+        self.P, self.Q, self.linear_complexity, self._r, self.length = P, Q, m, r, t
+        self._window, self._width = window, width
+        return m
+
+    def _joined_history(self):
+        """Every bit fed so far as an int, s_0 in the top bit."""
+        if len(self._history) > 1:
+            self._history = [''.join(self._history)]
+        return int(self._history[0] or '0', 2)
+
+    @property
+    def polynomial(self):
+        """Degrees of the feedback polynomial found so far, as returned by berlekamp_massey."""
+        return {i for i in range(self.P.bit_length()) if (self.P >> i) & 1}
+
+
+def berlekamp_massey(bits):
+    bm = BerlekampMassey()
+    bm.feed(bits)
+    return bm.polynomial
@@ -1,21 +1,140 @@
+from functools import lru_cache
+
+import numpy as np
+
+# key schedule round constants x^(i-1) in GF(2^8), enough for every key size
+RC = (0x01, 0x02, 0x04, 0x08, 0x10, 0x20, 0x40, 0x80, 0x1B, 0x36)
+
+
 class AES:
     
     def __init__(self, key):
         self.key = key
 
+    @property
+    def key(self):
+        return self._key
+
+    @key.setter
+    def key(self, key):
+        if len(key) not in (16, 24, 32):
+            raise ValueError("Key must be 16, 24 or 32 bytes long")
+        self._key = key
+        self._schedule = None
+
+    def _key_schedule(self):
+        # expanded once per key; _key_schedules shares it between instances
+        if self._schedule is None:
+            self._schedule = _key_schedules(bytes(self._key))
+        return self._schedule
+
+    @property
+    def round_keys(self):
+        """Round keys K_0..K_Nr as a tuple of 16-byte blocks."""
+        return self._key_schedule()[0]
+
+    @property
+    def inverse_round_keys(self):
+        """Round keys for the equivalent inverse cipher (InvMixColumns applied to K_1..K_Nr-1)."""
+        return self._key_schedule()[1]
+
     def encrypt(self, plaintext):
         if len(plaintext) != 16:
             raise ValueError("plaintext is not 16 bytes long")
         
-        round_keys = self.key_expansion()
+        round_keys = self.round_keys
         
-        Nr = 10
+        Nr = len(round_keys) - 1
         state = self.add_round_key(plaintext, round_keys[0])
         for i in range(1, Nr):
             state = self.round(state, round_keys[i])
         state = self.final_round(state, round_keys[Nr])
         return state
     
+    def encrypt_blocks(self, blocks, num_rounds=None):
+        """Encrypts an (n, 16) array of blocks at once, num_rounds as in partially_encrypt."""
+        round_keys = np.frombuffer(b''.join(self.round_keys), dtype=np.uint8).reshape(-1, 16)
+        return AES.encrypt_with_round_keys(blocks, round_keys, num_rounds)
+
+    @staticmethod
+    def encrypt_with_round_keys(blocks, round_keys, num_rounds=None):
+        """Batched encryption under expanded keys: round_keys is (Nr+1, 16) for one key
+        or (n, Nr+1, 16) for a separate key per block."""
+        for state in AES._batched_rounds(blocks, round_keys, num_rounds):
+            pass
+        return state
+
+    @staticmethod
+    def expand_keys(keys):
+        """Key schedules of an (n, 16/24/32) array of keys at once, as an (n, Nr+1, 16) array."""
+        keys = np.asarray(keys, dtype=np.uint8)
+        if keys.ndim != 2 or keys.shape[1] not in (16, 24, 32):
+            raise ValueError("Keys must be an (n, 16), (n, 24) or (n, 32) array")
+        n, Nk = len(keys), keys.shape[1] // 4
+        Nr = Nk + 6
+
+        # word i of every schedule is computed at once
+        words = np.empty((n, 4 * (Nr + 1), 4), dtype=np.uint8)
+        words[:, :Nk] = keys.reshape(n, Nk, 4)
+        for i in range(Nk, 4 * (Nr + 1)):
+            temp = words[:, i - 1]
+            if i % Nk == 0:
+                temp = _S_BOX[temp[:, [1, 2, 3, 0]]]
+                temp[:, 0] ^= RC[i // Nk - 1]
+            elif Nk > 6 and i % Nk == 4:
+                temp = _S_BOX[temp]
+            words[:, i] = words[:, i - Nk] ^ temp
+        return words.reshape(n, Nr + 1, 16)
+
+    @staticmethod
+    def encrypt_many_keys(keys, plaintexts, rounds=None):
+        """Encrypts plaintexts[i] under keys[i] for (n, 16) arrays, or one shared 16-byte
+        plaintext under every key; rounds as num_rounds in partially_encrypt."""
+        return AES.encrypt_with_round_keys(plaintexts, AES.expand_keys(keys), rounds)
+
+    @staticmethod
+    def trace_with_round_keys(blocks, round_keys):
+        """All round outputs of a batched encryption in one pass: an (Nr+1, n, 16) array
+        whose entry r equals encrypt_with_round_keys(blocks, round_keys, r)."""
+        return np.stack(list(AES._batched_rounds(blocks, round_keys, None)))
+
+    @staticmethod
+    def _batched_rounds(blocks, round_keys, num_rounds):
+        # yields the state after the initial AddRoundKey and after every round
+        state = AES.as_blocks(blocks)
+        round_keys = np.asarray(round_keys, dtype=np.uint8)
+        Nr = round_keys.shape[-2] - 1
+        full = num_rounds is None or num_rounds >= Nr
+
+        state = _add_round_key(state, round_keys[..., 0, :])
+        yield state
+        for i in range(1, Nr if full else num_rounds + 1):
+            state = _add_round_key(_mix_columns(_shift_rows(_sub_bytes(state))), round_keys[..., i, :])
+            yield state
+        if full:
+            yield _add_round_key(_shift_rows(_sub_bytes(state)), round_keys[..., Nr, :])
+
+    def decrypt_blocks(self, blocks):
+        """Decrypts an (n, 16) array of blocks at once."""
+        state = AES.as_blocks(blocks)
+        round_keys = np.frombuffer(b''.join(self.inverse_round_keys), dtype=np.uint8).reshape(-1, 16)
+        Nr = len(round_keys) - 1
+
+        state = _add_round_key(state, round_keys[Nr])
+        for i in range(Nr - 1, 0, -1):
+            state = _add_round_key(_inv_mix_columns(_inv_sub_bytes(_inv_shift_rows(state))), round_keys[i])
+        return _add_round_key(_inv_sub_bytes(_inv_shift_rows(state)), round_keys[0])
+
+    @staticmethod
+    def as_blocks(data):
+        """Views bytes or an array of bytes as an (n, 16) uint8 array."""
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            data = np.frombuffer(data, dtype=np.uint8)
+        data = np.asarray(data, dtype=np.uint8)
+        if data.size % 16 != 0:
+            raise ValueError("Data length must be a multiple of 16 bytes")
+        return data.reshape(-1, 16)
+
     @staticmethod
     def add_round_key(state, round_key):
         state = AES.to_matrix(state) if type(state[0]) is not list else state
@@ -64,23 +183,28 @@ class AES:
         return AES.to_bytes(new_state)
         
     def key_expansion(self):
-        key_bytes = list(self.key)
-        Nk = 4
-        Nr = 10
-        RC = [0x01, 0x02, 0x04, 0x08, 0x10, 0x20, 0x40, 0x80, 0x1B, 0x36]
+        return list(self.round_keys)
 
-        key_schedule = bytes(key_bytes)
+    @staticmethod
+    def expand_key(key):
+        key_bytes = bytes(key)
+        Nk = len(key_bytes) // 4
+        Nr = Nk + 6
 
-        while len(key_schedule) < 4 * (Nr + 1) * 4:
-            temp = list(key_schedule[-4:])
-            if len(key_schedule) % (Nk * 4) == 0:
-                temp = AES.g(temp, RC[len(key_schedule) // (Nk * 4) - 1])
-            for i in range(4):
-                temp[i] ^= key_schedule[-Nk * 4 + i]
-            key_schedule += bytes(temp)
+        # all 4 * (Nr + 1) words are allocated up front and filled in place
+        key_schedule = bytearray(16 * (Nr + 1))
+        key_schedule[:4 * Nk] = key_bytes
 
-        return [key_schedule[i:i+16] for i in range(0, len(key_schedule), 16)]
+        for i in range(Nk, 4 * (Nr + 1)):
+            temp = list(key_schedule[4 * i - 4:4 * i])
+            if i % Nk == 0:
+                temp = AES.g(temp, RC[i // Nk - 1])
+            elif Nk > 6 and i % Nk == 4:
+                temp = [AES.s_box[b] for b in temp]
+            for j in range(4):
+                key_schedule[4 * i + j] = temp[j] ^ key_schedule[4 * (i - Nk) + j]
 
+        return [bytes(key_schedule[i:i+16]) for i in range(0, len(key_schedule), 16)]
 
     @staticmethod
     def g(word, rc_i):
@@ -108,36 +232,73 @@ class AES:
         if len(plaintext) != 16:
             raise ValueError("Plaintext must be 16 bytes long")
         
-        if num_rounds is None or num_rounds >= 10:
+        round_keys = self.round_keys
+        if num_rounds is None or num_rounds >= len(round_keys) - 1:
             return self.encrypt(plaintext)
 
-        round_keys = self.key_expansion()
-
         state = self.add_round_key(AES.to_matrix(plaintext), round_keys[0])
 
         for i in range(1, num_rounds + 1):
             state = self.round(state, round_keys[i])
         return state
     
+    def encrypt_trace(self, plaintext, substeps=False):
+        """Encrypts once and returns the state after every round: entry r equals
+        partially_encrypt(plaintext, r) and the last entry is the ciphertext. With
+        substeps=True it returns (round, step, state) for every step instead."""
+        if len(plaintext) != 16:
+            raise ValueError("Plaintext must be 16 bytes long")
+
+        round_keys = self.round_keys
+        Nr = len(round_keys) - 1
+        state = self.add_round_key(plaintext, round_keys[0])
+        trace = [(0, 'add_round_key', state)]
+        for i in range(1, Nr + 1):
+            state = self.byte_substitution(state)
+            trace.append((i, 'byte_substitution', state))
+            state = self.shift_rows(state)
+            trace.append((i, 'shift_rows', state))
+            if i < Nr:
+                state = self.mix_column(state)
+                trace.append((i, 'mix_column', state))
+            state = self.add_round_key(state, round_keys[i])
+            trace.append((i, 'add_round_key', state))
+
+        if substeps:
+            return trace
+        return [state for _, step, state in trace if step == 'add_round_key']
+
     def decrypt(self, ciphertext):
         if len(ciphertext) != 16:
             raise ValueError("Ciphertext must be 16 bytes long")
         
-        round_keys = self.key_expansion()
+        round_keys = self.inverse_round_keys
         
-        Nr = 10
+        Nr = len(round_keys) - 1
         state = self.add_round_key(AES.to_matrix(ciphertext), round_keys[Nr])
-        state = self.inverse_shift_rows(state)
-        state = self.inverse_byte_substitution(state)
         for i in range(Nr - 1, 0, -1):
-            state = self.add_round_key(state, round_keys[i])
-            state = self.inverse_mix_column(state)
-            state = self.inverse_shift_rows(state)
             state = self.inverse_byte_substitution(state)
+            state = self.inverse_shift_rows(state)
+            state = self.inverse_mix_column(state)
+            state = self.add_round_key(state, round_keys[i])
 
+        state = self.inverse_byte_substitution(state)
+        state = self.inverse_shift_rows(state)
         state = self.add_round_key(state, round_keys[0])
         
         return state
+
+    @classmethod
+    def self_test(cls):
+        """Checks the single-block and batched paths against the FIPS-197 Appendix C vectors."""
+        for key, plaintext, ciphertext in FIPS_197_VECTORS:
+            key, plaintext, ciphertext = bytes.fromhex(key), bytes.fromhex(plaintext), bytes.fromhex(ciphertext)
+            aes = cls(key)
+            if (aes.encrypt(plaintext) != ciphertext or aes.decrypt(ciphertext) != plaintext
+                    or aes.encrypt_blocks(plaintext).tobytes() != ciphertext
+                    or aes.decrypt_blocks(ciphertext).tobytes() != plaintext):
+                raise RuntimeError(f"{cls.__name__} fails the FIPS-197 vector for AES-{8 * len(key)}")
+        return True
     
     @staticmethod
     def inverse_byte_substitution(state):
@@ -279,4 +440,208 @@ class AES:
 
     @staticmethod
     def to_bytes(matrix):
-        return bytes([matrix[row][col] for col in range(4) for row in range(4)])
\ No newline at end of file
+        return bytes([matrix[row][col] for col in range(4) for row in range(4)])
+
+# FIPS-197 Appendix C example vectors (key, plaintext, ciphertext) for AES-128/192/256
+FIPS_197_VECTORS = (
+    ('000102030405060708090a0b0c0d0e0f',
+     '00112233445566778899aabbccddeeff', '69c4e0d86a7b0430d8cdb78070b4c55a'),
+    ('000102030405060708090a0b0c0d0e0f1011121314151617',
+     '00112233445566778899aabbccddeeff', 'dda97ca4864cdfe06eaf70a0ec0d7191'),
+    ('000102030405060708090a0b0c0d0e0f101112131415161718191a1b1c1d1e1f',
+     '00112233445566778899aabbccddeeff', '8ea2b7ca516745bfeafc49904b496089'),
+)
+
+# byte tables for the batched NumPy path; blocks are column-major, byte 4*c + r
+_S_BOX = np.array(AES.s_box, dtype=np.uint8)
+_INV_S_BOX = np.array(AES.inverse_s_box, dtype=np.uint8)
+_MUL_02 = np.array([AES.mul_by_02(a) for a in range(256)], dtype=np.uint8)
+_MUL_03 = np.array([AES.mul_by_03(a) for a in range(256)], dtype=np.uint8)
+_MUL_09 = np.array([AES.mul_by_09(a) for a in range(256)], dtype=np.uint8)
+_MUL_0B = np.array([AES.mul_by_0B(a) for a in range(256)], dtype=np.uint8)
+_MUL_0D = np.array([AES.mul_by_0D(a) for a in range(256)], dtype=np.uint8)
+_MUL_0E = np.array([AES.mul_by_0E(a) for a in range(256)], dtype=np.uint8)
+_SHIFT_ROWS = np.array([4 * ((c + r) % 4) + r for c in range(4) for r in range(4)])
+_INV_SHIFT_ROWS = np.array([4 * ((c - r) % 4) + r for c in range(4) for r in range(4)])
+# the byte k rows further down the same column
+_ROW_1, _ROW_2, _ROW_3 = (np.array([4 * c + (r + k) % 4 for c in range(4) for r in range(4)])
+                          for k in (1, 2, 3))
+
+
+# stages of the batched path on (n, 16) arrays, looked up at call time so that
+# instrumentation can replace them
+def _sub_bytes(state):
+    return _S_BOX[state]
+
+
+def _shift_rows(state):
+    return state[:, _SHIFT_ROWS]
+
+
+def _mix_columns(state):
+    return _MUL_02[state] ^ _MUL_03[state[:, _ROW_1]] ^ state[:, _ROW_2] ^ state[:, _ROW_3]
+
+
+def _add_round_key(state, round_key):
+    return state ^ round_key
+
+
+def _inv_sub_bytes(state):
+    return _INV_S_BOX[state]
+
+
+def _inv_shift_rows(state):
+    return state[:, _INV_SHIFT_ROWS]
+
+
+def _inv_mix_columns(state):
+    return _MUL_0E[state] ^ _MUL_0B[state[:, _ROW_1]] ^ _MUL_0D[state[:, _ROW_2]] ^ _MUL_09[state[:, _ROW_3]]
+
+
+def _inverse_mix_round_keys(round_keys):
+    """InvMixColumns of K_1..K_Nr-1 for the equivalent inverse cipher. Part of the key
+    schedule, so it does not go through the MixColumns stage above."""
+    keys = np.frombuffer(b''.join(round_keys[1:-1]), dtype=np.uint8).reshape(-1, 16)
+    mixed = _MUL_0E[keys] ^ _MUL_0B[keys[:, _ROW_1]] ^ _MUL_0D[keys[:, _ROW_2]] ^ _MUL_09[keys[:, _ROW_3]]
+    return tuple(row.tobytes() for row in mixed)
+
+
+@lru_cache(maxsize=1024)
+def _key_schedules(key):
+    round_keys = tuple(AES.expand_key(key))
+    inverse_round_keys = round_keys[:1] + _inverse_mix_round_keys(round_keys) + round_keys[-1:]
+    return round_keys, inverse_round_keys
+
+
+@lru_cache(maxsize=1024)
+def _word_schedules(key):
+    round_keys, inverse_round_keys = _key_schedules(key)
+    enc_words = tuple(int.from_bytes(rk[i:i+4], 'big') for rk in round_keys for i in range(0, 16, 4))
+    dec_words = tuple(int.from_bytes(rk[i:i+4], 'big') for rk in inverse_round_keys[::-1] for i in range(0, 16, 4))
+    return round_keys, inverse_round_keys, enc_words, dec_words
+
+
+def _build_tables():
+    s_box, inv = AES.s_box, AES.inverse_s_box
+    te0, td0 = [], []
+    for x in range(256):
+        s, si = s_box[x], inv[x]
+        te0.append((AES.mul_by_02(s) << 24) | (s << 16) | (s << 8) | AES.mul_by_03(s))
+        td0.append((AES.mul_by_0E(si) << 24) | (AES.mul_by_09(si) << 16)
+                   | (AES.mul_by_0D(si) << 8) | AES.mul_by_0B(si))
+
+    def ror8(table):
+        return [((w >> 8) | (w << 24)) & 0xFFFFFFFF for w in table]
+
+    te1 = ror8(te0)
+    te2 = ror8(te1)
+    te3 = ror8(te2)
+    td1 = ror8(td0)
+    td2 = ror8(td1)
+    td3 = ror8(td2)
+    return (te0, te1, te2, te3), (td0, td1, td2, td3)
+
+
+_TE, _TD = _build_tables()
+
+
+class TableAES(AES):
+    """Word-oriented AES: the state is four 32-bit columns and each round is
+    sixteen lookups into the T-tables built at import, bit-exact with AES."""
+
+    def _key_schedule(self):
+        if self._schedule is None:
+            self._schedule = _word_schedules(bytes(self._key))
+        return self._schedule
+
+    @staticmethod
+    def _rounds(s0, s1, s2, s3, rk, num_rounds):
+        te0, te1, te2, te3 = _TE
+        k = 4
+        for _ in range(num_rounds):
+            t0 = te0[s0 >> 24] ^ te1[(s1 >> 16) & 0xFF] ^ te2[(s2 >> 8) & 0xFF] ^ te3[s3 & 0xFF] ^ rk[k]
+            t1 = te0[s1 >> 24] ^ te1[(s2 >> 16) & 0xFF] ^ te2[(s3 >> 8) & 0xFF] ^ te3[s0 & 0xFF] ^ rk[k + 1]
+            t2 = te0[s2 >> 24] ^ te1[(s3 >> 16) & 0xFF] ^ te2[(s0 >> 8) & 0xFF] ^ te3[s1 & 0xFF] ^ rk[k + 2]
+            t3 = te0[s3 >> 24] ^ te1[(s0 >> 16) & 0xFF] ^ te2[(s1 >> 8) & 0xFF] ^ te3[s2 & 0xFF] ^ rk[k + 3]
+            s0, s1, s2, s3 = t0, t1, t2, t3
+            k += 4
+        return s0, s1, s2, s3
+
+    def encrypt(self, plaintext):
+        if len(plaintext) != 16:
+            raise ValueError("plaintext is not 16 bytes long")
+
+        rk = self._key_schedule()[2]
+        Nr = len(rk) // 4 - 1
+        s0 = int.from_bytes(plaintext[0:4], 'big') ^ rk[0]
+        s1 = int.from_bytes(plaintext[4:8], 'big') ^ rk[1]
+        s2 = int.from_bytes(plaintext[8:12], 'big') ^ rk[2]
+        s3 = int.from_bytes(plaintext[12:16], 'big') ^ rk[3]
+        s0, s1, s2, s3 = self._rounds(s0, s1, s2, s3, rk, Nr - 1)
+        return self._final_round(s0, s1, s2, s3, rk, Nr)
+
+    @staticmethod
+    def _final_round(s0, s1, s2, s3, rk, Nr):
+        sb = AES.s_box
+        k = 4 * Nr
+        out = bytearray(16)
+        for c, (a, b, d, e) in enumerate(((s0, s1, s2, s3), (s1, s2, s3, s0),
+                                          (s2, s3, s0, s1), (s3, s0, s1, s2))):
+            w = ((sb[a >> 24] << 24) | (sb[(b >> 16) & 0xFF] << 16)
+                 | (sb[(d >> 8) & 0xFF] << 8) | sb[e & 0xFF]) ^ rk[k + c]
+            out[4 * c:4 * c + 4] = w.to_bytes(4, 'big')
+        return bytes(out)
+
+    def partially_encrypt(self, plaintext, num_rounds=None):
+        if len(plaintext) != 16:
+            raise ValueError("Plaintext must be 16 bytes long")
+
+        rk = self._key_schedule()[2]
+        Nr = len(rk) // 4 - 1
+        if num_rounds is None or num_rounds >= Nr:
+            return self.encrypt(plaintext)
+
+        s0 = int.from_bytes(plaintext[0:4], 'big') ^ rk[0]
+        s1 = int.from_bytes(plaintext[4:8], 'big') ^ rk[1]
+        s2 = int.from_bytes(plaintext[8:12], 'big') ^ rk[2]
+        s3 = int.from_bytes(plaintext[12:16], 'big') ^ rk[3]
+        s0, s1, s2, s3 = self._rounds(s0, s1, s2, s3, rk, num_rounds)
+        return ((s0 << 96) | (s1 << 64) | (s2 << 32) | s3).to_bytes(16, 'big')
+
+    def decrypt(self, ciphertext):
+        if len(ciphertext) != 16:
+            raise ValueError("Ciphertext must be 16 bytes long")
+
+        rk = self._key_schedule()[3]
+        Nr = len(rk) // 4 - 1
+        s0 = int.from_bytes(ciphertext[0:4], 'big') ^ rk[0]
+        s1 = int.from_bytes(ciphertext[4:8], 'big') ^ rk[1]
+        s2 = int.from_bytes(ciphertext[8:12], 'big') ^ rk[2]
+        s3 = int.from_bytes(ciphertext[12:16], 'big') ^ rk[3]
+        s0, s1, s2, s3 = self._inverse_rounds(s0, s1, s2, s3, rk, Nr - 1)
+        return self._inverse_final_round(s0, s1, s2, s3, rk, Nr)
+
+    @staticmethod
+    def _inverse_rounds(s0, s1, s2, s3, rk, num_rounds):
+        td0, td1, td2, td3 = _TD
+        k = 4
+        for _ in range(num_rounds):
+            t0 = td0[s0 >> 24] ^ td1[(s3 >> 16) & 0xFF] ^ td2[(s2 >> 8) & 0xFF] ^ td3[s1 & 0xFF] ^ rk[k]
+            t1 = td0[s1 >> 24] ^ td1[(s0 >> 16) & 0xFF] ^ td2[(s3 >> 8) & 0xFF] ^ td3[s2 & 0xFF] ^ rk[k + 1]
+            t2 = td0[s2 >> 24] ^ td1[(s1 >> 16) & 0xFF] ^ td2[(s0 >> 8) & 0xFF] ^ td3[s3 & 0xFF] ^ rk[k + 2]
+            t3 = td0[s3 >> 24] ^ td1[(s2 >> 16) & 0xFF] ^ td2[(s1 >> 8) & 0xFF] ^ td3[s0 & 0xFF] ^ rk[k + 3]
+            s0, s1, s2, s3 = t0, t1, t2, t3
+            k += 4
+        return s0, s1, s2, s3
+
+    @staticmethod
+    def _inverse_final_round(s0, s1, s2, s3, rk, Nr):
+        isb = AES.inverse_s_box
+        k = 4 * Nr
+        out = bytearray(16)
+        for c, (a, b, d, e) in enumerate(((s0, s3, s2, s1), (s1, s0, s3, s2),
+                                          (s2, s1, s0, s3), (s3, s2, s1, s0))):
+            w = ((isb[a >> 24] << 24) | (isb[(b >> 16) & 0xFF] << 16)
+                 | (isb[(d >> 8) & 0xFF] << 8) | isb[e & 0xFF]) ^ rk[k + c]
+            out[4 * c:4 * c + 4] = w.to_bytes(4, 'big')
+        return bytes(out)
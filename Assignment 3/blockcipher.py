@@ -1,18 +1,158 @@
 from aes import AES
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import contextlib
+import copy
+import hmac
+import numpy as np
 import os
+import weakref
+
+
+class GHash:
+    """GHASH over GF(2^128) with per-byte multiplication tables for the hash key H."""
+
+    R = 0xE1 << 120
+
+    def __init__(self, h):
+        # H * x^k for every bit position k of the 128-bit input
+        powers = [int.from_bytes(h, 'big')]
+        for _ in range(127):
+            v = powers[-1]
+            powers.append((v >> 1) ^ GHash.R if v & 1 else v >> 1)
+
+        # tables[j][b] = (b placed in byte j) * H, built from the bit products by linearity
+        self.tables = []
+        for j in range(16):
+            table = [0] * 256
+            for b in range(1, 256):
+                low = b & -b
+                table[b] = table[b ^ low] ^ powers[8 * j + 8 - low.bit_length()]
+            self.tables.append(table)
+
+        self.value = 0
+        self.buffer = b''
+
+    def multiply(self, x):
+        t = self.tables
+        b = x.to_bytes(16, 'big')
+        return (t[0][b[0]] ^ t[1][b[1]] ^ t[2][b[2]] ^ t[3][b[3]]
+                ^ t[4][b[4]] ^ t[5][b[5]] ^ t[6][b[6]] ^ t[7][b[7]]
+                ^ t[8][b[8]] ^ t[9][b[9]] ^ t[10][b[10]] ^ t[11][b[11]]
+                ^ t[12][b[12]] ^ t[13][b[13]] ^ t[14][b[14]] ^ t[15][b[15]])
+
+    def update(self, data):
+        """Absorbs whole blocks of data and buffers a trailing partial block."""
+        data = self.buffer + bytes(data)
+        end = len(data) - len(data) % 16
+        y = self.value
+        for i in range(0, end, 16):
+            y = self.multiply(y ^ int.from_bytes(data[i:i+16], 'big'))
+        self.value = y
+        self.buffer = data[end:]
+
+    def pad(self):
+        """Zero-pads and absorbs the buffered partial block."""
+        if self.buffer:
+            self.value = self.multiply(self.value ^ int.from_bytes(self.buffer.ljust(16, b'\0'), 'big'))
+            self.buffer = b''
+
+    def copy(self):
+        other = GHash.__new__(GHash)
+        other.tables = self.tables
+        other.value = self.value
+        other.buffer = self.buffer
+        return other
+
+
+# cipher installed in each pool process by _init_worker
+_worker_cipher = None
+
+
+def _init_worker(cipher):
+    global _worker_cipher
+    _worker_cipher = cipher
+
+
+def _run_in_worker(method, *args):
+    return getattr(_worker_cipher, method)(*args)
+
 
 class BlockCipher:
-    def __init__(self, key, iv=None, algorithm=AES, mode='ECB'):
+    # blocks per call into the algorithm's batched encrypt_blocks/decrypt_blocks
+    batch_size = 4096
+    # bytes per task when the work is spread over worker processes
+    parallel_chunk_size = 1 << 20
+    # bytes of the nonce that encrypt() and encryptor() put in front of a CTR or GCM ciphertext
+    nonce_sizes = {'CTR': 16, 'GCM': 12}
+
+    def __init__(self, key, iv=None, algorithm=AES, mode='ECB', associated_data=b'', workers=None):
         self.key = key
         self.algorithm = algorithm(key)
         self.mode = mode
+        self.associated_data = associated_data
+        self.workers = workers
+        self._ghash = None
+        self._executor = None
+        self._executor_finalizer = None
+        self._nonces = set()        # explicit CTR/GCM nonces already used with this key
 
-        # random IV if not provided
+        # random IV if not provided; CTR and GCM only use it as the default of
+        # ctr_encrypt/gcm_encrypt, encrypt() draws a fresh nonce for every message
         if iv is None:
             self.iv = os.urandom(16)
         else:
             self.iv = iv
 
+    def __getstate__(self):
+        # what gets shipped to the pool: the algorithm with its expanded key, no pool of its own
+        state = self.__dict__.copy()
+        state.update(workers=None, _executor=None, _executor_finalizer=None, _ghash=None, _nonces=set())
+        return state
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Shuts down the worker pool started by the first parallel call. A cipher that
+        is dropped without close() releases its pool when it is garbage collected."""
+        if self._executor is not None:
+            self._executor_finalizer.detach()
+            self._executor.shutdown()
+            self._executor = self._executor_finalizer = None
+
+    def _parallel(self, length):
+        return self.workers is not None and self.workers > 1 and length > self.parallel_chunk_size
+
+    def _run_parallel(self, method, data, chunk_args):
+        """Splits data into aligned chunks, runs `method` on each in the pool and
+        copies the results into a preallocated buffer as they complete. At most two
+        chunks per worker are in flight, so memory stays near the input plus output."""
+        if self._executor is None:
+            getattr(self.algorithm, 'round_keys', None)  # expand the key before it is shipped
+            # the pool keeps its initargs, so it gets a copy without the pool (see
+            # __getstate__) and does not keep this cipher alive
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                 initargs=(copy.copy(self),))
+            self._executor_finalizer = weakref.finalize(self, self._executor.shutdown, wait=False)
+        step = self.parallel_chunk_size - self.parallel_chunk_size % 16
+        out = bytearray(len(data))
+        offsets = iter(range(0, len(data), step))
+        pending = {}
+        while True:
+            for i in offsets:
+                pending[self._executor.submit(_run_in_worker, method, bytes(data[i:i+step]), *chunk_args(i))] = i
+                if len(pending) >= 2 * self.workers:
+                    break
+            if not pending:
+                return bytes(out)
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = pending.pop(future)
+                out[i:i+step] = future.result()
+
     def pad(self, plaintext, block_size=16):
         padding_length = block_size - len(plaintext) % block_size
         return plaintext + bytes([padding_length] * padding_length)
@@ -21,7 +161,41 @@ class BlockCipher:
         padding_length = padded_text[-1]
         return padded_text[:-padding_length]
 
-    def encrypt(self, plaintext):
+    def new_nonce(self, nonce=None):
+        """Returns a random nonce for the mode, or checks that `nonce` has the right
+        size and has not been used with this key before."""
+        size = self.nonce_sizes.get(self.mode)
+        if size is None:
+            raise ValueError(f"{self.mode} does not take a nonce")
+        if nonce is None:
+            return os.urandom(size)
+        nonce = bytes(nonce)
+        if len(nonce) != size:
+            raise ValueError(f"{self.mode} nonce must be {size} bytes")
+        if nonce in self._nonces:
+            raise ValueError("Nonce already used with this key")
+        self._nonces.add(nonce)
+        return nonce
+
+    def split_nonce(self, ciphertext):
+        """Returns (nonce, rest) of a CTR or GCM ciphertext produced by encrypt()."""
+        size = self.nonce_sizes[self.mode]
+        if len(ciphertext) < size:
+            raise ValueError("Ciphertext is shorter than the nonce")
+        return bytes(ciphertext[:size]), ciphertext[size:]
+
+    def encrypt(self, plaintext, nonce=None):
+        # counter modes are stream modes and need no padding; every message gets its
+        # own nonce (random unless given), which goes in front of the ciphertext
+        if self.mode == 'CTR':
+            nonce = self.new_nonce(nonce)
+            return nonce + self.ctr_encrypt(plaintext, initial=nonce)
+        elif self.mode == 'GCM':
+            nonce = self.new_nonce(nonce)
+            return nonce + self.gcm_encrypt(plaintext, nonce)
+        elif nonce is not None:
+            raise ValueError(f"{self.mode} does not take a nonce")
+
         plaintext = self.pad(plaintext)
 
         if self.mode == 'ECB':
@@ -36,6 +210,13 @@ class BlockCipher:
             raise ValueError("Unsupported mode")
 
     def decrypt(self, ciphertext):
+        if self.mode == 'CTR':
+            nonce, ciphertext = self.split_nonce(ciphertext)
+            return self.ctr_decrypt(ciphertext, initial=nonce)
+        elif self.mode == 'GCM':
+            nonce, ciphertext = self.split_nonce(ciphertext)
+            return self.gcm_decrypt(ciphertext, nonce)
+
         if self.mode == 'ECB':
             decrypted = self.ecb_decrypt(ciphertext)
         elif self.mode == 'CBC':
@@ -49,85 +230,432 @@ class BlockCipher:
 
         return self.unpad(decrypted)
 
+    @classmethod
+    def self_test(cls, algorithm=AES):
+        """Checks GCM against test cases 2, 4 and 6 of the GCM specification (McGrew and
+        Viega): a 96-bit IV, associated data and a 60-byte IV, one-shot and streamed
+        where the IV fits encrypt()'s nonce. Then checks that CTR and GCM encrypt()
+        never repeat a nonce."""
+        for key, iv, associated_data, plaintext, ciphertext in GCM_VECTORS:
+            key, iv, associated_data, plaintext, ciphertext = (bytes.fromhex(v) for v in
+                                                              (key, iv, associated_data, plaintext, ciphertext))
+            cipher = cls(key, iv, algorithm=algorithm, mode='GCM', associated_data=associated_data)
+            passed = cipher.gcm_encrypt(plaintext) == ciphertext and cipher.gcm_decrypt(ciphertext) == plaintext
+            if len(iv) == cls.nonce_sizes['GCM']:
+                streamed = cipher.encryptor(iv)
+                passed = (passed and cipher.decrypt(iv + ciphertext) == plaintext
+                          and streamed.update(plaintext[:7]) + streamed.update(plaintext[7:]) + streamed.finalize()
+                          == iv + ciphertext
+                          and b''.join(cipher.decrypt_chunks([iv[:5], iv[5:] + ciphertext[:7], ciphertext[7:]]))
+                          == plaintext)
+            if not passed:
+                raise RuntimeError(f"{algorithm.__name__} GCM fails the test vector with a {8 * len(iv)}-bit IV")
+        cls._check_fresh_nonces(algorithm)
+        return True
+
+    @classmethod
+    def _check_fresh_nonces(cls, algorithm):
+        message = bytes(64)
+        for mode in ('CTR', 'GCM'):
+            cipher = cls(bytes(16), algorithm=algorithm, mode=mode)
+            ciphertexts = [cipher.encrypt(message), cipher.encrypt(message), b''.join(cipher.encrypt_chunks([message]))]
+            if len(set(ciphertexts)) != len(ciphertexts) or any(cipher.decrypt(c) != message for c in ciphertexts):
+                raise RuntimeError(f"{algorithm.__name__} {mode} repeats a nonce")
+            nonce = bytes(cls.nonce_sizes[mode])
+            cipher.encrypt(message, nonce)
+            try:
+                cipher.encryptor(nonce)
+            except ValueError:
+                continue
+            raise RuntimeError(f"{algorithm.__name__} {mode} accepts a nonce twice")
+
+    def encrypt_blocks(self, data):
+        """Encrypts whole blocks independently, batched when the algorithm supports it."""
+        if not hasattr(self.algorithm, 'encrypt_blocks'):
+            return b''.join(self.algorithm.encrypt(data[i:i+16]) for i in range(0, len(data), 16))
+
+        out = bytearray(len(data))
+        step = 16 * self.batch_size
+        for i in range(0, len(data), step):
+            out[i:i+step] = self.algorithm.encrypt_blocks(data[i:i+step]).tobytes()
+        return bytes(out)
+
+    def decrypt_blocks(self, data):
+        """Decrypts whole blocks independently, batched when the algorithm supports it."""
+        if not hasattr(self.algorithm, 'decrypt_blocks'):
+            return b''.join(self.algorithm.decrypt(data[i:i+16]) for i in range(0, len(data), 16))
+
+        out = bytearray(len(data))
+        step = 16 * self.batch_size
+        for i in range(0, len(data), step):
+            out[i:i+step] = self.algorithm.decrypt_blocks(data[i:i+step]).tobytes()
+        return bytes(out)
+
+    @staticmethod
+    def xor_bytes(a, b):
+        # like zip, the result is as long as the shorter input
+        n = min(len(a), len(b))
+        return (np.frombuffer(a, dtype=np.uint8, count=n) ^ np.frombuffer(b, dtype=np.uint8, count=n)).tobytes()
+
     def ecb_encrypt(self, plaintext):
-        ciphertext = bytearray()
-        for i in range(0, len(plaintext), 16):
-            block = plaintext[i:i+16]
-            encrypted_block = self.algorithm.encrypt(block)
-            ciphertext.extend(encrypted_block)
-        return bytes(ciphertext)
+        if self._parallel(len(plaintext)):
+            return self._run_parallel('ecb_encrypt', plaintext, lambda i: ())
+        return self.encrypt_blocks(plaintext)
 
     def ecb_decrypt(self, ciphertext):
-        plaintext = bytearray()
-        for i in range(0, len(ciphertext), 16):
-            block = ciphertext[i:i+16]
-            decrypted_block = self.algorithm.decrypt(block)
-            plaintext.extend(decrypted_block)
-        return bytes(plaintext)
-
-    def cbc_encrypt(self, plaintext):
+        if self._parallel(len(ciphertext)):
+            return self._run_parallel('ecb_decrypt', ciphertext, lambda i: ())
+        return self.decrypt_blocks(ciphertext)
+
+    def cbc_encrypt(self, plaintext, iv=None):
         ciphertext = bytearray()
-        prev_block = self.iv
+        prev_block = self.iv if iv is None else iv
 
         for i in range(0, len(plaintext), 16):
             block = plaintext[i:i+16]
-            xor_block = bytes([b ^ p for b, p in zip(block, prev_block)])
+            xor_block = self.xor_bytes(block, prev_block)
             encrypted_block = self.algorithm.encrypt(xor_block)
             ciphertext.extend(encrypted_block)
             prev_block = encrypted_block
 
         return bytes(ciphertext)
 
-    def cbc_decrypt(self, ciphertext):
-        plaintext = bytearray()
-        prev_block = self.iv
-
-        for i in range(0, len(ciphertext), 16):
-            block = ciphertext[i:i+16]
-            decrypted_block = self.algorithm.decrypt(block)
-            xor_block = bytes([b ^ p for b, p in zip(decrypted_block, prev_block)])
-            plaintext.extend(xor_block)
-            prev_block = block
+    def cbc_decrypt(self, ciphertext, iv=None):
+        # every block depends only on two ciphertext blocks, so decrypt them all at once
+        ciphertext = bytes(ciphertext)
+        iv = self.iv if iv is None else iv
+        if self._parallel(len(ciphertext)):
+            return self._run_parallel('cbc_decrypt', ciphertext,
+                                      lambda i: (ciphertext[i-16:i] if i else iv,))
+        decrypted = self.decrypt_blocks(ciphertext)
+        return self.xor_bytes(decrypted, (bytes(iv) + ciphertext)[:len(ciphertext)])
 
-        return bytes(plaintext)
-
-    def ofb_encrypt(self, plaintext):
+    def ofb_encrypt(self, plaintext, iv=None):
         ciphertext = bytearray()
-        output = self.iv
+        output = self.iv if iv is None else iv
 
         for i in range(0, len(plaintext), 16):
             output = self.algorithm.encrypt(output)
             block = plaintext[i:i+16]
-            xor_block = bytes([b ^ o for b, o in zip(block, output)])
+            xor_block = self.xor_bytes(block, output)
             ciphertext.extend(xor_block)
 
         return bytes(ciphertext)
 
-    def ofb_decrypt(self, ciphertext):
-        return self.ofb_encrypt(ciphertext)
+    def ofb_decrypt(self, ciphertext, iv=None):
+        return self.ofb_encrypt(ciphertext, iv)
 
-    def cfb_encrypt(self, plaintext):
+    def cfb_encrypt(self, plaintext, iv=None):
         ciphertext = bytearray()
-        feedback = self.iv
+        feedback = self.iv if iv is None else iv
 
         for i in range(0, len(plaintext), 16):
             feedback = self.algorithm.encrypt(feedback)
             block = plaintext[i:i+16]
-            xor_block = bytes([b ^ f for b, f in zip(block, feedback)])
+            xor_block = self.xor_bytes(block, feedback)
             ciphertext.extend(xor_block)
             feedback = xor_block
 
         return bytes(ciphertext)
 
-    def cfb_decrypt(self, ciphertext):
-        plaintext = bytearray()
-        feedback = self.iv
+    def cfb_decrypt(self, ciphertext, iv=None):
+        # the keystream is the encryption of the previous ciphertext blocks
+        ciphertext = bytes(ciphertext)
+        iv = self.iv if iv is None else iv
+        keystream = self.encrypt_blocks((bytes(iv) + ciphertext)[:len(ciphertext)])
+        return self.xor_bytes(ciphertext, keystream)
+
+    @staticmethod
+    def counter_blocks(initial, start, n, width=128):
+        """Returns the n counter blocks initial+start, ..., incrementing the low `width` bits (32 or 128)."""
+        initial = bytes(initial)
+        if width == 32:
+            counters = (int.from_bytes(initial[12:], 'big') + start + np.arange(n, dtype=np.uint64)) & 0xFFFFFFFF
+            blocks = np.empty((n, 16), dtype=np.uint8)
+            blocks[:, :12] = np.frombuffer(initial[:12], dtype=np.uint8)
+            blocks[:, 12:] = counters.astype('>u4').view(np.uint8).reshape(n, 4)
+            return blocks
+        elif width == 128:
+            high, low = divmod((int.from_bytes(initial, 'big') + start) % (1 << 128), 1 << 64)
+            lows = np.uint64(low) + np.arange(n, dtype=np.uint64)
+            highs = np.uint64(high) + (lows < np.uint64(low)).astype(np.uint64)
+            blocks = np.empty((n, 16), dtype=np.uint8)
+            blocks[:, :8] = highs.astype('>u8').view(np.uint8).reshape(n, 8)
+            blocks[:, 8:] = lows.astype('>u8').view(np.uint8).reshape(n, 8)
+            return blocks
+        else:
+            raise ValueError("Counter width must be 32 or 128 bits")
+
+    def ctr_encrypt(self, plaintext, offset=0, initial=None, width=128):
+        """XORs plaintext with the keystream starting at byte `offset`, so any region
+        can be processed on its own without the preceding data."""
+        initial = self.iv if initial is None else initial
+        if self._parallel(len(plaintext)):
+            return self._run_parallel('ctr_encrypt', plaintext,
+                                      lambda i: (offset + i, initial, width))
+        out = bytearray(len(plaintext))
+        step = 16 * self.batch_size
+        for i in range(0, len(plaintext), step):
+            chunk = plaintext[i:i+step]
+            first, skip = divmod(offset + i, 16)
+            n = (skip + len(chunk) + 15) // 16
+            keystream = self.encrypt_blocks(self.counter_blocks(initial, first, n, width).tobytes())
+            out[i:i+len(chunk)] = self.xor_bytes(chunk, keystream[skip:skip+len(chunk)])
+        return bytes(out)
+
+    def ctr_decrypt(self, ciphertext, offset=0, initial=None, width=128):
+        return self.ctr_encrypt(ciphertext, offset, initial, width)
+
+    def gcm_ghash(self):
+        """Returns a fresh GHASH for this key; the multiplication tables are built once."""
+        if self._ghash is None:
+            self._ghash = GHash(self.algorithm.encrypt(bytes(16)))
+        return self._ghash.copy()
+
+    def gcm_initial_counter(self, iv=None):
+        iv = bytes(self.iv if iv is None else iv)
+        if len(iv) == 12:
+            return iv + b'\0\0\0\1'
+        ghash = self.gcm_ghash()
+        ghash.update(iv)
+        ghash.pad()
+        ghash.update(bytes(8) + (8 * len(iv)).to_bytes(8, 'big'))
+        return ghash.value.to_bytes(16, 'big')
+
+    def gcm_start(self, iv=None):
+        """Returns the initial counter block and a GHASH that has absorbed the associated data."""
+        ghash = self.gcm_ghash()
+        ghash.update(self.associated_data)
+        ghash.pad()
+        return self.gcm_initial_counter(iv), ghash
+
+    def gcm_finish(self, ghash, ciphertext_length, initial_counter):
+        """Returns the tag once the whole ciphertext has gone through ghash."""
+        ghash.pad()
+        ghash.update((8 * len(self.associated_data)).to_bytes(8, 'big') + (8 * ciphertext_length).to_bytes(8, 'big'))
+        return self.xor_bytes(self.algorithm.encrypt(initial_counter), ghash.value.to_bytes(16, 'big'))
+
+    def gcm_encrypt(self, plaintext, iv=None):
+        """Returns the ciphertext followed by the 16-byte authentication tag. The IV
+        (self.iv by default) must never be used twice with the same key."""
+        j0, ghash = self.gcm_start(iv)
+        ciphertext = self.ctr_encrypt(plaintext, 16, j0, width=32)
+        ghash.update(ciphertext)
+        return ciphertext + self.gcm_finish(ghash, len(ciphertext), j0)
+
+    def gcm_decrypt(self, ciphertext, iv=None):
+        if len(ciphertext) < 16:
+            raise ValueError("Ciphertext is shorter than the authentication tag")
+        ciphertext, tag = ciphertext[:-16], ciphertext[-16:]
+        j0, ghash = self.gcm_start(iv)
+        ghash.update(ciphertext)
+        if not hmac.compare_digest(self.gcm_finish(ghash, len(ciphertext), j0), tag):
+            raise ValueError("Authentication tag mismatch")
+        return self.ctr_decrypt(ciphertext, 16, j0, width=32)
+
+    def encryptor(self, nonce=None):
+        return BlockCipherContext(self, encrypting=True, nonce=nonce)
+
+    def decryptor(self):
+        return BlockCipherContext(self, encrypting=False)
+
+    def encrypt_chunks(self, chunks):
+        """Yields the encryption of an iterable of byte chunks, chunk by chunk."""
+        context = self.encryptor()
+        for chunk in chunks:
+            yield context.update(chunk)
+        yield context.finalize()
+
+    def decrypt_chunks(self, chunks):
+        context = self.decryptor()
+        for chunk in chunks:
+            yield context.update(chunk)
+        yield context.finalize()
+
+    def encrypt_file(self, src, dst, chunk_size=1 << 16):
+        """Encrypts src into dst (paths or binary file objects) in constant memory.
+        Returns the number of bytes read."""
+        return self._transform_file(self.encryptor(), src, dst, chunk_size)
+
+    def decrypt_file(self, src, dst, chunk_size=1 << 16):
+        return self._transform_file(self.decryptor(), src, dst, chunk_size)
+
+    @staticmethod
+    def _transform_file(context, src, dst, chunk_size):
+        with contextlib.ExitStack() as stack:
+            if isinstance(src, (str, os.PathLike)):
+                src = stack.enter_context(open(src, 'rb'))
+            if isinstance(dst, (str, os.PathLike)):
+                dst = stack.enter_context(open(dst, 'wb'))
+
+            buffer = bytearray(chunk_size)
+            view = memoryview(buffer)
+            total = 0
+            while True:
+                n = src.readinto(buffer)
+                if not n:
+                    break
+                dst.write(context.update(view[:n]))
+                total += n
+            dst.write(context.finalize())
+        return total
+
+
+class BlockCipherContext:
+    """Incremental encryption or decryption with update(chunk)/finalize().
+
+    Only a partial block is buffered between calls (plus the last block when
+    decrypting a padded mode, or the tag for GCM), so memory does not depend on
+    the message size. GCM decryption releases plaintext before the tag has been
+    checked in finalize(); discard it if finalize() raises. CTR and GCM output
+    starts with the nonce, as with BlockCipher.encrypt().
+    """
+
+    def __init__(self, cipher, encrypting, nonce=None):
+        if cipher.mode not in ('ECB', 'CBC', 'CFB', 'OFB', 'CTR', 'GCM'):
+            raise ValueError("Unsupported mode")
+        self.cipher = cipher
+        self.mode = cipher.mode
+        self.encrypting = encrypting
+        self.chaining = bytes(cipher.iv)
+        self.buffer = bytearray()
+        self.length = 0
+        self.finalized = False
+        self.nonce = None
+        self.header = b''           # output not yet returned, the nonce when encrypting
+        if self.mode in ('CTR', 'GCM') and encrypting:
+            self._start(cipher.new_nonce(nonce))
+            self.header = self.nonce
+        elif nonce is not None:
+            raise ValueError("Only CTR and GCM encryption take a nonce")
+
+    def _start(self, nonce):
+        self.nonce = nonce
+        if self.mode == 'GCM':
+            self.initial_counter, self.ghash = self.cipher.gcm_start(nonce)
+
+    def update(self, data):
+        if self.finalized:
+            raise ValueError("Context already finalized")
+
+        if self.mode in ('CTR', 'GCM'):
+            if self.nonce is None:
+                # decrypting: the ciphertext starts with the nonce
+                self.buffer += data
+                size = self.cipher.nonce_sizes[self.mode]
+                if len(self.buffer) < size:
+                    return b''
+                self._start(bytes(self.buffer[:size]))
+                data = bytes(self.buffer[size:])
+                self.buffer.clear()
+            if self.mode == 'CTR':
+                out = self.cipher.ctr_encrypt(data, self.length, self.nonce)
+                self.length += len(data)
+            else:
+                out = self._gcm_update(data)
+            out, self.header = self.header + out, b''
+            return out
+
+        self.buffer += data
+        if self.encrypting:
+            end = len(self.buffer) - len(self.buffer) % 16
+        else:
+            # hold back the last block, it carries the padding
+            end = max(len(self.buffer) - 16, 0)
+            end -= end % 16
+        blocks = bytes(self.buffer[:end])
+        del self.buffer[:end]
+        return self._process(blocks)
+
+    def finalize(self):
+        if self.finalized:
+            raise ValueError("Context already finalized")
+        self.finalized = True
+
+        if self.mode in ('CTR', 'GCM') and self.nonce is None:
+            raise ValueError("Ciphertext is shorter than the nonce")
+        if self.mode == 'CTR':
+            return self.header
+        elif self.mode == 'GCM':
+            return self.header + self._gcm_finalize()
+
+        if self.encrypting:
+            return self._process(self.cipher.pad(bytes(self.buffer)))
+        if len(self.buffer) != 16:
+            raise ValueError("Ciphertext length is not a multiple of the block size")
+        return self.cipher.unpad(self._process(bytes(self.buffer)))
+
+    def _process(self, blocks):
+        if not blocks:
+            return b''
+        cipher = self.cipher
+        if self.mode == 'ECB':
+            return cipher.ecb_encrypt(blocks) if self.encrypting else cipher.ecb_decrypt(blocks)
+        elif self.mode == 'CBC':
+            if self.encrypting:
+                out = cipher.cbc_encrypt(blocks, self.chaining)
+                self.chaining = out[-16:]
+            else:
+                out = cipher.cbc_decrypt(blocks, self.chaining)
+                self.chaining = blocks[-16:]
+        elif self.mode == 'CFB':
+            if self.encrypting:
+                out = cipher.cfb_encrypt(blocks, self.chaining)
+                self.chaining = out[-16:]
+            else:
+                out = cipher.cfb_decrypt(blocks, self.chaining)
+                self.chaining = blocks[-16:]
+        else:
+            out = cipher.ofb_encrypt(blocks, self.chaining)
+            # the last keystream block is the next OFB input
+            self.chaining = cipher.xor_bytes(out[-16:], blocks[-16:])
+        return out
+
+    def _gcm_update(self, data):
+        if self.encrypting:
+            out = self.cipher.ctr_encrypt(data, 16 + self.length, self.initial_counter, width=32)
+            self.ghash.update(out)
+            self.length += len(data)
+            return out
+
+        # the final 16 bytes may be the tag
+        self.buffer += data
+        end = max(len(self.buffer) - 16, 0)
+        ciphertext = bytes(self.buffer[:end])
+        del self.buffer[:end]
+        self.ghash.update(ciphertext)
+        out = self.cipher.ctr_decrypt(ciphertext, 16 + self.length, self.initial_counter, width=32)
+        self.length += len(ciphertext)
+        return out
+
+    def _gcm_finalize(self):
+        tag = self.cipher.gcm_finish(self.ghash, self.length, self.initial_counter)
+        if self.encrypting:
+            return tag
+        if len(self.buffer) != 16 or not hmac.compare_digest(tag, bytes(self.buffer)):
+            raise ValueError("Authentication tag mismatch")
+        return b''
 
-        for i in range(0, len(ciphertext), 16):
-            feedback = self.algorithm.encrypt(feedback)
-            block = ciphertext[i:i+16]
-            xor_block = bytes([b ^ f for b, f in zip(block, feedback)])
-            plaintext.extend(xor_block)
-            feedback = block
 
-        return bytes(plaintext)
+# (key, IV, associated data, plaintext, ciphertext followed by the tag)
+GCM_VECTORS = (
+    ('00000000000000000000000000000000', '000000000000000000000000', '',
+     '00000000000000000000000000000000',
+     '0388dace60b6a392f328c2b971b2fe78' 'ab6e47d42cec13bdf53a67b21257bddf'),
+    ('feffe9928665731c6d6a8f9467308308', 'cafebabefacedbaddecaf888',
+     'feedfacedeadbeeffeedfacedeadbeefabaddad2',
+     'd9313225f88406e5a55909c5aff5269a86a7a9531534f7da2e4c303d8a318a72'
+     '1c3c0c95956809532fcf0e2449a6b525b16aedf5aa0de657ba637b39',
+     '42831ec2217774244b7221b784d0d49ce3aa212f2c02a4e035c17e2329aca12e'
+     '21d514b25466931c7d8f6a5aac84aa051ba30b396a0aac973d58e091'
+     '5bc94fbc3221a5db94fae95ae7121a47'),
+    ('feffe9928665731c6d6a8f9467308308',
+     '9313225df88406e555909c5aff5269aa6a7a9538534f7da1e4c303d2a318a728'
+     'c3c0c95156809539fcf0e2429a6b525416aedbf5a0de6a57a637b39b',
+     'feedfacedeadbeeffeedfacedeadbeefabaddad2',
+     'd9313225f88406e5a55909c5aff5269a86a7a9531534f7da2e4c303d8a318a72'
+     '1c3c0c95956809532fcf0e2449a6b525b16aedf5aa0de657ba637b39',
+     '8ce24998625615b603a033aca13fb894be9112a5c3a211a8ba262a3cca7e2ca7'
+     '01e4a9a4fba43c90ccdcb281d48c7c6fd62875d2aca417034c34aee5'
+     '619cc5aefffe0bfa462af43c1699d050'),
+)
@@ -1,20 +1,37 @@
 from aes import AES
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import os
 import random
 
+# trials drawn from one child seed, so results do not depend on the number of workers
+TRIAL_CHUNK = 1 << 14
+
+# number of set bits in every byte value
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
 def hamming_distance(a, b):
-    distance = 0
-    for byte1, byte2 in zip(a, b):
-        xor_result = byte1 ^ byte2
-        bits_different = bin(xor_result).count('1')
-        distance += bits_different
-    return distance
+    return (int.from_bytes(a, 'big') ^ int.from_bytes(b, 'big')).bit_count()
+
+def hamming_distances(a, b):
+    """Hamming distances between the rows of two (n, 16) uint8 arrays."""
+    return _POPCOUNT[np.bitwise_xor(a, b)].sum(axis=-1, dtype=np.int64)
 
 def flip_bit(x: bytes, index: int) -> bytes:
-    byte_index = index // 8
-    bit_index = index % 8
-    flipped_byte = x[byte_index] ^ (1 << (7 - bit_index))
-    return x[:byte_index] + bytes([flipped_byte]) + x[byte_index + 1:]
+    flipped = bytearray(x)
+    flip_bit_inplace(flipped, index)
+    return bytes(flipped)
+
+def flip_bit_inplace(buffer, index):
+    """Flips bit index (MSB first) of a bytearray or uint8 array."""
+    buffer[index // 8] ^= 0x80 >> (index % 8)
+
+def flip_bits(blocks, indices):
+    """Flips bit indices[i] of row i of an (n, 16) uint8 array in place."""
+    indices = np.asarray(indices)
+    blocks[np.arange(len(blocks)), indices // 8] ^= (0x80 >> (indices % 8)).astype(np.uint8)
+    return blocks
 
 
 def aes_diffusion(num_round=None):
@@ -43,4 +60,60 @@ def aes_confusion(num_round=None):
     ciphertext = aes.partially_encrypt(plaintext, num_round)
     flipped_ciphertext = flipped_aes.partially_encrypt(plaintext, num_round)
     
-    return hamming_distance(ciphertext, flipped_ciphertext)
\ No newline at end of file
+    return hamming_distance(ciphertext, flipped_ciphertext)
+
+
+def _run_chunk(experiment, num_rounds, seed_sequence, trials):
+    rng = np.random.default_rng(seed_sequence)
+    plaintexts = rng.integers(0, 256, (trials, 16), dtype=np.uint8)
+    keys = rng.integers(0, 256, (trials, 16), dtype=np.uint8)
+    indices = rng.integers(0, 128, trials)
+
+    round_keys = AES.expand_keys(keys)
+    if experiment == 'diffusion':
+        flipped_plaintexts, flipped_keys = flip_bits(plaintexts.copy(), indices), round_keys
+    else:
+        flipped_plaintexts, flipped_keys = plaintexts, AES.expand_keys(flip_bits(keys.copy(), indices))
+
+    if not isinstance(num_rounds, (list, tuple, range)):
+        ciphertexts = AES.encrypt_with_round_keys(plaintexts, round_keys, num_rounds)
+        flipped = AES.encrypt_with_round_keys(flipped_plaintexts, flipped_keys, num_rounds)
+        return hamming_distances(ciphertexts, flipped)
+
+    # one traced encryption pair covers every round count
+    trace = AES.trace_with_round_keys(plaintexts, round_keys)
+    flipped = AES.trace_with_round_keys(flipped_plaintexts, flipped_keys)
+    Nr = len(trace) - 1
+    return np.stack([hamming_distances(trace[r], flipped[r])
+                     for r in (Nr if r is None else min(r, Nr) for r in num_rounds)])
+
+
+def _run_experiment(experiment, num_rounds, trials, seed, workers):
+    sizes = [min(TRIAL_CHUNK, trials - i) for i in range(0, trials, TRIAL_CHUNK)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = ([experiment] * len(sizes), [num_rounds] * len(sizes), seeds, sizes)
+
+    if workers is None or workers <= 1:
+        results = list(map(_run_chunk, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_run_chunk, *args))
+    if not results:
+        shape = (len(num_rounds), 0) if isinstance(num_rounds, (list, tuple, range)) else (0,)
+        return np.zeros(shape, dtype=np.int64)
+    return np.concatenate(results, axis=-1)
+
+
+def diffusion_experiment(num_rounds=None, trials=1000, seed=None, workers=None):
+    """Batched aes_diffusion: Hamming distances of `trials` ciphertext pairs whose
+    plaintexts differ in one random bit, as a NumPy array. The same seed gives the
+    same distances for any number of workers.
+
+    num_rounds may also be a sequence of round counts; the result is then a
+    (len(num_rounds), trials) array computed from a single encryption pair per trial."""
+    return _run_experiment('diffusion', num_rounds, trials, seed, workers)
+
+
+def confusion_experiment(num_rounds=None, trials=1000, seed=None, workers=None):
+    """Batched aes_confusion: as diffusion_experiment, but with one key bit flipped."""
+    return _run_experiment('confusion', num_rounds, trials, seed, workers)
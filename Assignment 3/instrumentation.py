@@ -0,0 +1,160 @@
+"""Opt-in per-stage call counts and timings for AES and BlockCipher.
+
+enable() wraps the stage methods on the classes themselves, and the round
+helpers of the batched path in the aes module, so nothing in the code paths
+changes and disabled instrumentation costs nothing; disable() puts the
+originals back. The T-table rounds do all four round steps in one lookup and
+are counted as table_rounds and table_final_round instead of per step. The
+InvMixColumns of the decryption key schedule counts as key_expansion, not
+mix_columns. Times are inclusive wall time (a stage that calls
+another stage counts that time too). Work done in BlockCipher pool processes
+is not recorded.
+
+    with instrumented():
+        cipher.encrypt(data)
+    print(snapshot())
+"""
+import aes
+from aes import AES, TableAES
+from blockcipher import BlockCipher, GHash
+import contextlib
+import cProfile
+import functools
+import time
+
+
+# (stage, class or module, attribute, index of the data argument counted in bytes or None)
+TARGETS = [
+    # the key schedule, including InvMixColumns of the decryption round keys
+    ('key_expansion', AES, 'expand_key', 0),
+    ('key_expansion', AES, 'expand_keys', 0),
+    ('key_expansion', aes, '_inverse_mix_round_keys', None),
+    # byte-oriented reference path
+    ('sub_bytes', AES, 'byte_substitution', None),
+    ('sub_bytes', AES, 'inverse_byte_substitution', None),
+    ('shift_rows', AES, 'shift_rows', None),
+    ('shift_rows', AES, 'inverse_shift_rows', None),
+    ('mix_columns', AES, 'mix_column', None),
+    ('mix_columns', AES, 'inverse_mix_column', None),
+    ('add_round_key', AES, 'add_round_key', None),
+    # batched NumPy path (encrypt_blocks, decrypt_blocks and everything built on them)
+    ('sub_bytes', aes, '_sub_bytes', 0),
+    ('sub_bytes', aes, '_inv_sub_bytes', 0),
+    ('shift_rows', aes, '_shift_rows', 0),
+    ('shift_rows', aes, '_inv_shift_rows', 0),
+    ('mix_columns', aes, '_mix_columns', 0),
+    ('mix_columns', aes, '_inv_mix_columns', 0),
+    ('add_round_key', aes, '_add_round_key', 0),
+    # T-table path, where SubBytes, ShiftRows, MixColumns and AddRoundKey are one lookup
+    ('table_rounds', TableAES, '_rounds', None),
+    ('table_rounds', TableAES, '_inverse_rounds', None),
+    ('table_final_round', TableAES, '_final_round', None),
+    ('table_final_round', TableAES, '_inverse_final_round', None),
+    # whole blocks
+    ('block_encrypt', AES, 'encrypt', 1),
+    ('block_encrypt', AES, 'encrypt_blocks', 1),
+    ('block_encrypt', TableAES, 'encrypt', 1),
+    ('block_decrypt', AES, 'decrypt', 1),
+    ('block_decrypt', AES, 'decrypt_blocks', 1),
+    ('block_decrypt', TableAES, 'decrypt', 1),
+    ('batch_encrypt', BlockCipher, 'encrypt_blocks', 1),
+    ('batch_decrypt', BlockCipher, 'decrypt_blocks', 1),
+    # modes
+    ('mode_xor', BlockCipher, 'xor_bytes', 0),
+    ('padding', BlockCipher, 'pad', 1),
+    ('padding', BlockCipher, 'unpad', 1),
+    ('ghash', GHash, 'update', 1),
+    ('encrypt', BlockCipher, 'encrypt', 1),
+    ('decrypt', BlockCipher, 'decrypt', 1),
+]
+
+_stats = {}
+_originals = {}
+
+
+def _size(data):
+    nbytes = getattr(data, 'nbytes', None)
+    return len(data) if nbytes is None else nbytes
+
+
+def _wrap(stage, func, data_index):
+    stats = _stats.setdefault(stage, {'calls': 0, 'seconds': 0.0, 'bytes': 0})
+    perf_counter = time.perf_counter
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stats['seconds'] += perf_counter() - start
+            stats['calls'] += 1
+            if data_index is not None and len(args) > data_index:
+                stats['bytes'] += _size(args[data_index])
+    return wrapper
+
+
+def enable():
+    """Installs the timing wrappers; does nothing if they are already installed."""
+    if _originals:
+        return
+    for stage, owner, name, data_index in TARGETS:
+        if name not in vars(owner):
+            continue
+        original = vars(owner)[name]
+        if isinstance(original, staticmethod):
+            wrapped = staticmethod(_wrap(stage, original.__func__, data_index))
+        else:
+            wrapped = _wrap(stage, original, data_index)
+        _originals[owner, name] = original
+        setattr(owner, name, wrapped)
+
+
+def disable():
+    """Restores the original methods; the collected numbers are kept."""
+    for (owner, name), original in _originals.items():
+        setattr(owner, name, original)
+    _originals.clear()
+
+
+def is_enabled():
+    return bool(_originals)
+
+
+def reset():
+    for stats in _stats.values():
+        stats.update(calls=0, seconds=0.0, bytes=0)
+
+
+def snapshot():
+    """Returns {stage: {'calls', 'seconds', 'bytes'}} for every stage called so far."""
+    return {stage: dict(stats) for stage, stats in _stats.items() if stats['calls']}
+
+
+@contextlib.contextmanager
+def instrumented(fresh=True):
+    """Enables instrumentation for the block (starting from zero unless fresh=False)."""
+    if fresh:
+        reset()
+    was_enabled = is_enabled()
+    enable()
+    try:
+        yield
+    finally:
+        if not was_enabled:
+            disable()
+
+
+@contextlib.contextmanager
+def profile(profiler=None):
+    """Runs the block under a profiler and yields it: a cProfile.Profile by default,
+    or any object with start()/stop() such as pyinstrument.Profiler."""
+    if profiler is None:
+        profiler = cProfile.Profile()
+    start, stop = ((profiler.start, profiler.stop) if hasattr(profiler, 'start')
+                   else (profiler.enable, profiler.disable))
+    start()
+    try:
+        yield profiler
+    finally:
+        stop()
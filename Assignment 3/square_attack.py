@@ -0,0 +1,95 @@
+import aes
+from aes import AES, RC, _INV_S_BOX
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+_GUESSES = np.arange(256, dtype=np.uint8)
+
+
+def lambda_set(active=0, rng=None):
+    """256 plaintexts that take every value in byte `active` and share random constant bytes."""
+    rng = np.random.default_rng(rng)
+    plaintexts = np.repeat(rng.integers(0, 256, (1, 16), dtype=np.uint8), 256, axis=0)
+    plaintexts[:, active] = _GUESSES
+    return plaintexts
+
+
+def balanced_guesses(ciphertexts, positions=range(16)):
+    """For each position, the key bytes k of InvMixColumns(K_4) for which the bytes
+    InvSubBytes(c' ^ k) of a Λ-set are balanced (XOR to zero), c' being the
+    ciphertexts with the last MixColumns removed."""
+    # the InvMixColumns stage of the batched path, so instrumentation counts it as mix_columns
+    columns = aes._inv_mix_columns(ciphertexts)[:, list(positions)].T  # (positions, 256 texts)
+    # (positions, guesses, texts) partial decryptions, XOR-reduced over the texts
+    sums = np.bitwise_xor.reduce(_INV_S_BOX[columns[:, None, :] ^ _GUESSES[None, :, None]], axis=2)
+    return [set(np.flatnonzero(row == 0).tolist()) for row in sums]
+
+
+def _candidates_in_worker(ciphertext_sets, positions):
+    candidates = [set(range(256)) for _ in positions]
+    for ciphertexts in ciphertext_sets:
+        for i, guesses in enumerate(balanced_guesses(ciphertexts, positions)):
+            candidates[i] &= guesses
+    return candidates
+
+
+def invert_key_schedule(round_key, round_number):
+    """Returns the AES-128 key whose round key number `round_number` is round_key."""
+    words = [list(round_key[i:i+4]) for i in range(0, 16, 4)]
+    for r in range(round_number, 0, -1):
+        # w[i-4] = w[i] ^ w[i-1] for the last three words, then the first uses g(w[i-1])
+        previous = [None] * 4
+        for j in range(3, 0, -1):
+            previous[j] = [a ^ b for a, b in zip(words[j], words[j - 1])]
+        previous[0] = [a ^ b for a, b in zip(words[0], AES.g(previous[3], RC[r - 1]))]
+        words = previous
+    return bytes(sum(words, []))
+
+
+def four_round_oracle(aes):
+    """Chosen-plaintext oracle for `aes` reduced to 4 rounds, as in partially_encrypt."""
+    return lambda plaintexts: aes.encrypt_blocks(plaintexts, 4)
+
+
+def square_attack(oracle, max_sets=8, seed=None, workers=None):
+    """Recovers the AES-128 key behind a 4-round chosen-plaintext `oracle` that maps an
+    (n, 16) array of plaintexts to ciphertexts, using the integral (Square) property.
+
+    Three rounds keep every byte of a Λ-set balanced. The fourth round here includes
+    MixColumns (as partially_encrypt does), so it is undone first, which turns the key
+    guess into one on InvMixColumns(K_4). Each Λ-set leaves about one false guess per
+    byte; further sets are queried until all 16 bytes are unique. Returns None if that
+    does not happen within max_sets sets, or if the key found does not reproduce the
+    oracle on a fresh Λ-set (for example when the oracle is not AES-128)."""
+    rng = np.random.default_rng(seed)
+    candidates = [set(range(256)) for _ in range(16)]
+    # byte positions are independent, so each pool process takes a group of them
+    workers = 1 if workers is None else min(max(workers, 1), 16)
+    groups = [list(range(16))[i::workers] for i in range(workers)]
+    executor = ProcessPoolExecutor(max_workers=len(groups)) if len(groups) > 1 else None
+    try:
+        for n in range(max_sets):
+            ciphertexts = AES.as_blocks(oracle(lambda_set(n % 16, rng)))
+            if executor is None:
+                found = _candidates_in_worker([ciphertexts], range(16))
+            else:
+                found = [None] * 16
+                futures = [executor.submit(_candidates_in_worker, [ciphertexts], group) for group in groups]
+                for group, future in zip(groups, futures):
+                    for position, guesses in zip(group, future.result()):
+                        found[position] = guesses
+            candidates = [c & f for c, f in zip(candidates, found)]
+            if all(len(c) == 1 for c in candidates):
+                break
+        else:
+            return None
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    inverse_mixed_key = bytes(c.pop() for c in candidates)
+    key = invert_key_schedule(AES.mix_column(inverse_mixed_key), 4)
+    plaintexts = lambda_set(int(rng.integers(16)), rng)
+    if not np.array_equal(AES.as_blocks(oracle(plaintexts)), AES(key).encrypt_blocks(plaintexts, 4)):
+        return None
+    return key
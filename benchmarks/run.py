@@ -0,0 +1,142 @@
+"""Throughput benchmarks for the Assignment 2 and 3 engines.
+
+    python benchmarks/run.py                              # full run, table on stdout
+    python benchmarks/run.py --quick --output new.json    # small sizes, save results
+    python benchmarks/run.py --baseline old.json          # compare, exit 1 on regressions
+
+Every benchmark reports a rate (MB/s, bits/s or trials/s; higher is better) taken
+from the best of several repeats.
+"""
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'Assignment 2'), os.path.join(ROOT, 'Assignment 3')]
+
+from aes import AES, TableAES
+from bitgenerator import AlternatingStep
+from bits import Bits
+from blockcipher import BlockCipher
+from diffusion_confusion import aes_confusion, aes_diffusion, confusion_experiment, diffusion_experiment
+from lfsr import LFSR, berlekamp_massey
+
+MODES = ('ECB', 'CBC', 'CFB', 'OFB', 'CTR', 'GCM')
+POLY_64 = {64, 4, 3, 1, 0}
+
+
+def measure(func, min_time=0.2, max_repeat=5):
+    """Best wall time of func() over repeats, until min_time has been spent."""
+    best, spent, repeat = float('inf'), 0.0, 0
+    while repeat < max_repeat and (repeat == 0 or spent < min_time):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best, spent, repeat = min(best, elapsed), spent + elapsed, repeat + 1
+    return best
+
+
+def benchmarks(quick):
+    """Yields (name, unit, amount, func) where one call of func processes `amount` units."""
+    key, iv = bytes(range(16)), bytes(range(16, 32))
+    sizes = (1 << 10, 1 << 14) if quick else (1 << 10, 1 << 16, 1 << 20)
+
+    for engine in (AES, TableAES):
+        aes = engine(key)
+        blocks = [os.urandom(16) for _ in range(64 if quick else 1024)]
+        megabytes = 16 * len(blocks) / 1e6
+        yield f'{engine.__name__}.encrypt', 'MB/s', megabytes, lambda aes=aes, blocks=blocks: [aes.encrypt(b) for b in blocks]
+        yield f'{engine.__name__}.decrypt', 'MB/s', megabytes, lambda aes=aes, blocks=blocks: [aes.decrypt(b) for b in blocks]
+
+    for engine in (AES, TableAES):
+        for mode in MODES:
+            cipher = BlockCipher(key, iv[:12] if mode == 'GCM' else iv, algorithm=engine, mode=mode)
+            # the reference engine encrypts chained modes block by block, keep it small
+            for size in sizes if engine is TableAES else sizes[:2]:
+                data = os.urandom(size)
+                ciphertext = cipher.encrypt(data)
+                name = f'BlockCipher[{engine.__name__}].{mode}'
+                yield f'{name}.encrypt/{size}', 'MB/s', size / 1e6, lambda c=cipher, d=data: c.encrypt(d)
+                yield f'{name}.decrypt/{size}', 'MB/s', size / 1e6, lambda c=cipher, d=ciphertext: c.decrypt(d)
+
+    steps = 1 << (14 if quick else 20)
+    lfsr = LFSR(POLY_64, state=Bits(random.getrandbits(64), 64))
+    yield 'LFSR.run_steps', 'bits/s', steps, lambda: lfsr.run_steps(steps)
+    generator = AlternatingStep(Bits(random.getrandbits(12), 12))
+    yield 'AlternatingStep.run', 'bits/s', steps, lambda: generator.run(steps)
+
+    for length in (1000, 10000) if quick else (1000, 10000, 100000, 1000000):
+        sequence = LFSR(POLY_64, state=Bits(random.getrandbits(64), 64)).run_steps(length)
+        yield f'berlekamp_massey/{length}', 'bits/s', length, lambda s=sequence: berlekamp_massey(s)
+
+    trials = 20 if quick else 200
+    yield 'aes_diffusion', 'trials/s', trials, lambda: [aes_diffusion(10) for _ in range(trials)]
+    yield 'aes_confusion', 'trials/s', trials, lambda: [aes_confusion(10) for _ in range(trials)]
+    trials = 1000 if quick else 100000
+    yield 'diffusion_experiment', 'trials/s', trials, lambda: diffusion_experiment(10, trials, seed=0)
+    yield 'confusion_experiment', 'trials/s', trials, lambda: confusion_experiment(10, trials, seed=0)
+
+
+def run(quick=False, pattern='*'):
+    results = {}
+    for name, unit, amount, func in benchmarks(quick):
+        if not fnmatch.fnmatch(name, pattern):
+            continue
+        seconds = measure(func)
+        results[name] = {'unit': unit, 'rate': amount / seconds, 'seconds': seconds}
+        print(f'{name:55} {amount / seconds:14.4g} {unit}', flush=True)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Prints the rate ratio against the baseline; returns the names that got slower than threshold."""
+    regressions = []
+    print(f'\n{"benchmark":55} {"baseline":>12} {"current":>12} {"ratio":>7}')
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result['rate'] / baseline[name]['rate']
+        flag = ''
+        if ratio < 1 - threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f'{name:55} {baseline[name]["rate"]:12.4g} {result["rate"]:12.4g} {ratio:7.2f}{flag}')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quick', action='store_true', help='small sizes for a fast smoke run')
+    parser.add_argument('--filter', default='*', help='only run benchmarks matching this glob')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative slowdown reported as a regression (default 0.1)')
+    args = parser.parse_args(argv)
+
+    results = run(args.quick, args.filter)
+    report = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'quick': args.quick,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())